@@ -1,6 +1,37 @@
 # Database setup for sqlite3
 DB_TYPE = "sqlite"
-DB_CONFIG = {"dbname": "Arkfolio.db"}
+DB_CONFIG = {
+    "dbname": "Arkfolio.db",
+    # Seconds to wait for a lock of another connection
+    "timeout": 10,
+    # Nr of read-only connections, used by threads next to the one writer
+    "readers": 4,
+    # Performance profile, pragmas applied when the database is opened
+    # WAL lets the ui read while the server is writing
+    "pragmas": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 268435456,  # 256 MB
+        "cache_size": -65536,  # negative is in KiB, 64 MB
+        "temp_store": "MEMORY",
+        "busy_timeout": 10000,  # ms
+        "foreign_keys": "ON",
+    },
+    # Timings and counts per sql statement, summary is logged by the server
+    "instrument": False,
+    # Log statements slower than this in milliseconds (0 = off)
+    "slow_query_ms": 100,
+}
+# Number of inserted transactions per database commit
+DB_COMMIT_BATCH_SIZE = 500
+# Number of rows per executemany call for bulk inserts
+DB_EXECUTEMANY_CHUNK_SIZE = 1000
+# Number of rows per fetch when streaming query results
+DB_FETCH_ARRAYSIZE = 1000
+# Number of values per IN (...) list, sqlite limits the number of parameters
+DB_IN_CHUNK_SIZE = 500
+# Number of addresses in the address to wallet cache used during ingest
+ADDRESS_CACHE_SIZE = 50000
 
 # Logging
 MAX_SIZE_LOGFILE_MB = 1
@@ -18,7 +49,67 @@ IMAGE_PATH = "images"
 # requests
 REQUESTS_TIMEOUT = 20
 REQUESTS_RETRIES = 5
+# Connections kept alive per host, shared by all threads
+REQUESTS_POOL_SIZE = 10
+# Retries by the shared connection pool of retry_calls on connection errors
+# and 502, 503, 504, RequestHelper sessions use REQUESTS_RETRIES
+REQUESTS_POOL_RETRIES = 3
+REQUESTS_BACKOFF_FACTOR = 1.5
+
+# Server
+# How the server searches the wallets of all sites:
+# "sequential": one wallet after the other
+# "async": all wallets at the same time with the fetch engine
+# "threads": a pool of worker threads per site
+SERVER_FETCH_MODE = "sequential"
+# Nr of worker threads per site name in "threads" mode
+SERVER_SITE_WORKERS = {
+    "Bitcoin": 1,
+}
+SERVER_SITE_WORKERS_DEFAULT = 2
+# Nr of requests at the same time per host in the fetch engine
+FETCH_CONCURRENCY = {
+    "blockchain.info": 1,
+}
+FETCH_CONCURRENCY_DEFAULT = 4
 
 # Sitemodels
 BLOCKCHAININFO_BACKOFF = 15
-CHILD_ADDRESS_BATCH_SIZE = 10
+# Nr of addresses per multiaddr request for the txns of many addresses, 1 is per address
+BLOCKCHAININFO_MULTIADDR_SIZE = 50
+# Nr of txns per multiaddr request, maximum is 100
+BLOCKCHAININFO_MULTIADDR_PAGE = 100
+ESPLORA_BACKOFF = 5
+# Chain data provider of Bitcoin, "blockchain.info" or "esplora"
+BITCOIN_PROVIDER = "blockchain.info"
+# Url of the api per chain data provider, can be a self-hosted or a replay server
+BITCOIN_PROVIDER_URLS = {
+    "blockchain.info": "https://blockchain.info",
+    "esplora": "https://blockstream.info/api",
+}
+# Nr of unused child addresses in a row after which a chain is not searched further
+GAP_LIMIT = 20
+# Nr of master public keys of which the derived addresses are kept in memory,
+# least recently used is removed
+DERIVATION_CACHE_SIZE = 100
+# Processes for the derivation of many child addresses, 0 is the nr of cpus
+DERIVATION_WORKERS = 0
+# Minimum nr of new child addresses to derive them in the processes
+DERIVATION_PARALLEL_MIN = 1000
+# Nr of child addresses per task of a process
+DERIVATION_CHUNK_SIZE = 250
+# Maximum nr of child addresses derived ahead of the gap limit scan, the
+# window doubles while the addresses are used, from DERIVATION_PARALLEL_MIN
+# it is derived in the processes
+DERIVATION_WINDOW_MAX = 4000
+# Number of addresses per request for the nr of txns and balance, also the
+# maximum of a gap limit scan request
+TRANSACTION_INFO_BATCH_SIZE = 100
+# Rate limit per host: (requests, window in seconds, burst)
+# Hosts not in this list are not limited
+RATE_LIMITS = {
+    "blockchain.info": (1, BLOCKCHAININFO_BACKOFF, 1),
+    # Esplora has one request per address, one per second and a burst of
+    # the requests of one backoff time
+    "blockstream.info": (ESPLORA_BACKOFF, ESPLORA_BACKOFF, ESPLORA_BACKOFF),
+}
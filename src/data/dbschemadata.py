@@ -1,7 +1,7 @@
 """
 @author: Arno
 @created: 2023-05-25
-@modified: 2023-10-27
+@modified: 2026-10-17
 
 Data Classes for data from database
 
@@ -130,6 +130,17 @@ class TransactionRaw:
     note: str = ""
 
 
+@dataclass
+class TransactionPage:
+    """Dataclass for one page of raw transactions read from a site
+    n_tx = all time nr of txns per address the page is read for,
+    last is set on the last page of those addresses"""
+
+    transactions: list[TransactionRaw]
+    n_tx: dict[str, int] = field(default_factory=dict)
+    last: bool = False
+
+
 @dataclass
 class Price:
     """Dataclass for price history"""
@@ -1,16 +1,24 @@
 """
 @author: Arno
 @created: 2022-11-02
-@modified: 2023-05-20
+@modified: 2026-10-17
 
 Database Class
 
 """
 import logging
+import queue
 import sqlite3
-from typing import Any
+import threading
+import time
+from contextlib import contextmanager
+from itertools import islice
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator
 
 import config
+from src.db.dbstats import DbStats
+from src.errors.dberrors import DbError
 
 log = logging.getLogger(__name__)
 
@@ -29,11 +37,35 @@ class Db:
         db.open()
         ...
         db.close()
+
+        # Unit of work, commit once at the end or rollback on error
+        with db.transaction():
+            db.execute(...)
+            db.commit()  # deferred until end of with block
+
+    threads:
+        All writes go through one writer connection, serialized by a lock.
+        A transaction() block holds the lock until it ends, writes outside
+        a transaction() block hold it until commit() or rollback().
+        Reads use a pool of read-only connections (config 'readers'),
+        unless the thread is inside a transaction or has uncommitted writes,
+        then the writer connection is used to see its own changes.
+        With checkout() a read-only connection is kept by the thread
+        for the with block. In memory databases only use the writer.
     """
 
     def __init__(self, config: dict):
         self.config = config
         self.conn: sqlite3.Connection = None  # type: ignore
+        self.write_lock = threading.RLock()
+        self.readers: queue.Queue[sqlite3.Connection] = queue.Queue()
+        self.readers_open: list[sqlite3.Connection] = []
+        self.readers_lock = threading.Lock()
+        self.local = threading.local()
+        self.stats: DbStats | None = None
+        self.rollback_hooks: list[Callable[[], None]] = []
+        if config.get("instrument", False):
+            self.enable_stats(config.get("slow_query_ms", 0))
 
     def __enter__(self):
         try:
@@ -47,20 +79,155 @@ class Db:
 
     def close(self):
         if self.has_connection():
-            self.commit()
-            self.conn.close()
-            self.conn = None  # type: ignore
+            with self.write_lock:
+                self.commit()
+                self.conn.close()
+                self.conn = None  # type: ignore
+            with self.readers_lock:
+                for reader in self.readers_open:
+                    reader.close()
+                self.readers_open.clear()
+                self.readers = queue.Queue()
             log.debug(f"DB Closed")
 
     def open(self):
         """Function to create and open or only open a connection to the database"""
         if not self.has_connection():
             dbname = self.config["dbname"]
-            self.conn = sqlite3.connect(dbname, timeout=10)
+            timeout = self.config.get("timeout", 10)
+            self.conn = sqlite3.connect(
+                dbname, timeout=timeout, check_same_thread=False
+            )
+            self._apply_pragmas(self.conn)
             log.debug(f"DB Connected: {dbname}")
         else:
             log.debug(f"DB already connected {self.conn}")
 
+    def _apply_pragmas(self, conn: sqlite3.Connection, readonly: bool = False) -> None:
+        """Apply the performance profile from the config to the connection"""
+        pragmas: dict = self.config.get("pragmas", {})
+        for name, value in pragmas.items():
+            if not name.isidentifier():
+                raise DbError(f"Invalid pragma name in database config: {name}")
+            if readonly and name == "journal_mode":
+                # Stored in the database file by the writer
+                continue
+            conn.execute(f"PRAGMA {name}={value}")
+        log.debug(f"DB Pragmas applied: {pragmas}")
+
+    def get_settings(self) -> dict[str, Any]:
+        """Returns the effective value of the pragmas from the config"""
+        settings: dict[str, Any] = {}
+        with self.write_lock:
+            for name in self.config.get("pragmas", {}):
+                res = self.conn.execute(f"PRAGMA {name}").fetchone()
+                settings[name] = None if res == None else res[0]
+        return settings
+
+    def use_readers(self) -> bool:
+        """Read-only connections are used for a file database with readers > 0"""
+        dbname: str = self.config["dbname"]
+        in_memory = dbname in ("", ":memory:") or "mode=memory" in dbname
+        return self.config.get("readers", 0) > 0 and not in_memory
+
+    def _connect_reader(self) -> sqlite3.Connection:
+        """Open a new read-only connection"""
+        uri = f"{Path(self.config['dbname']).resolve().as_uri()}?mode=ro"
+        timeout = self.config.get("timeout", 10)
+        conn = sqlite3.connect(uri, timeout=timeout, uri=True, check_same_thread=False)
+        self._apply_pragmas(conn, readonly=True)
+        log.debug(f"DB Connected read-only: {uri}")
+        return conn
+
+    def _get_reader(self) -> sqlite3.Connection:
+        """Get a read-only connection from the pool, open a new one if allowed"""
+        try:
+            return self.readers.get_nowait()
+        except queue.Empty:
+            pass
+        with self.readers_lock:
+            if len(self.readers_open) < self.config.get("readers", 0):
+                reader = self._connect_reader()
+                self.readers_open.append(reader)
+                return reader
+        try:
+            return self.readers.get(timeout=self.config.get("timeout", 10))
+        except queue.Empty as e:
+            raise DbError("No read-only database connection available") from e
+
+    @contextmanager
+    def checkout(self) -> Iterator["Db"]:
+        """Keep a read-only connection for this thread during the with block"""
+        if getattr(self.local, "reader", None) != None or not self.use_readers():
+            yield self
+            return
+        reader = self._get_reader()
+        self.local.reader = reader
+        try:
+            yield self
+        finally:
+            self.local.reader = None
+            self.readers.put(reader)
+
+    @contextmanager
+    def _read_connection(self) -> Iterator[sqlite3.Connection]:
+        """Connection for reading by the current thread"""
+        if (
+            not self.use_readers()
+            or self.in_transaction()
+            or getattr(self.local, "dirty", False)
+        ):
+            # Must see its own uncommitted changes
+            with self.write_lock:
+                yield self.conn
+            return
+        reader = getattr(self.local, "reader", None)
+        if reader != None:
+            yield reader
+            return
+        reader = self._get_reader()
+        try:
+            yield reader
+        finally:
+            self.readers.put(reader)
+
+    def _set_dirty(self) -> None:
+        """Remember uncommitted writes outside a unit of work for this thread
+
+        The thread keeps the write lock until its commit or rollback, all
+        threads share the writer connection. Otherwise another thread could
+        commit or roll back these writes, or start a unit of work over them.
+        Must be called with the write lock.
+        """
+        if self.in_transaction():
+            return
+        dirty = getattr(self.local, "dirty", False)
+        if self.conn.in_transaction and not dirty:
+            self.write_lock.acquire()
+            self.local.dirty = True
+        elif not self.conn.in_transaction and dirty:
+            self._clear_dirty()
+
+    def _clear_dirty(self) -> None:
+        """Release the write lock kept for the uncommitted writes of this thread"""
+        if getattr(self.local, "dirty", False):
+            self.local.dirty = False
+            self.write_lock.release()
+
+    def add_rollback_hook(self, hook: Callable[[], None]) -> None:
+        """Function called after a rollback, for example to clear a cache"""
+        self.rollback_hooks.append(hook)
+
+    def _run_rollback_hooks(self) -> None:
+        for hook in self.rollback_hooks:
+            hook()
+
+    def enable_stats(self, slow_query_ms: float = 0) -> DbStats:
+        """Start recording timings and counts per statement"""
+        if self.stats == None:
+            self.stats = DbStats(slow_query_ms)
+        return self.stats
+
     def execute(self, sql: str, params=None) -> int:
         """Execute a query
 
@@ -71,14 +238,76 @@ class Db:
         params = dictionary for parameters in query
         return value = rowcount or total changes
         """
-        log.debug(f"DB execute: {sql}, {params}")
-        cursor = self.conn.cursor()
-        if params:
-            cursor.execute(sql, params)
-        else:
-            cursor.execute(sql)
-        result = self.conn.total_changes
-        cursor.close()
+        log.debug("DB execute: %s, %s", sql, params)
+        with self.write_lock:
+            start = time.perf_counter()
+            cursor = self.conn.cursor()
+            if params:
+                cursor.execute(sql, params)
+            else:
+                cursor.execute(sql)
+            result = self.conn.total_changes
+            if self.stats != None:
+                rows = max(cursor.rowcount, 0)
+                self.stats.record(sql, time.perf_counter() - start, rows, params)
+            cursor.close()
+            self._set_dirty()
+        return result
+
+    def execute_returning(self, sql: str, params=None) -> list[Any]:
+        """Execute a query that writes and returns rows, like RETURNING
+
+        Always runs on the writer connection, query() may use a read-only one
+
+        sql = query to execute,
+        params = dictionary for parameters in query
+        return value = fetched data from query
+        """
+        log.debug("DB execute returning: %s, %s", sql, params)
+        with self.write_lock:
+            start = time.perf_counter()
+            cursor = self.conn.cursor()
+            if params:
+                cursor.execute(sql, params)
+            else:
+                cursor.execute(sql)
+            result = cursor.fetchall()
+            cursor.close()
+            if self.stats != None:
+                self.stats.record(sql, time.perf_counter() - start, len(result), params)
+            self._set_dirty()
+        return result
+
+    def executemany(self, sql: str, rows: Iterable[tuple], chunk_size: int = 0) -> int:
+        """Execute a query for every row of parameters
+
+        Rows are streamed to sqlite in chunks, so the iterable can be a generator
+
+        sql = query to execute,
+        rows = iterable of tuples with parameters for the query
+        chunk_size = nr of rows per executemany call, default from config
+        return value = total changes
+        """
+        if chunk_size <= 0:
+            chunk_size = config.DB_EXECUTEMANY_CHUNK_SIZE
+        log.debug("DB executemany: %s", sql)
+        with self.write_lock:
+            start = time.perf_counter()
+            cursor = self.conn.cursor()
+            rows_iter = iter(rows)
+            nr_rows = 0
+            while True:
+                chunk = list(islice(rows_iter, chunk_size))
+                if not chunk:
+                    break
+                cursor.executemany(sql, chunk)
+                nr_rows += len(chunk)
+            result = self.conn.total_changes
+            cursor.close()
+            if self.stats != None:
+                self.stats.record(sql, time.perf_counter() - start, nr_rows)
+            self._set_dirty()
+        log.debug("DB executemany end, rows: %s", nr_rows)
         return result
 
     def query(self, sql: str, params=None) -> list[Any]:
@@ -88,35 +317,177 @@ class Db:
         params = dictionary for parameters in query
         return value = fetched data from query
         """
-        log.debug(f"DB query: {sql}, {params}")
-        cursor = self.conn.cursor()
-        if params:
-            cursor.execute(sql, params)
-        else:
-            cursor.execute(sql)
-        result = cursor.fetchall()
-        cursor.close()
+        log.debug("DB query: %s, %s", sql, params)
+        with self._read_connection() as conn:
+            start = time.perf_counter()
+            cursor = conn.cursor()
+            if params:
+                cursor.execute(sql, params)
+            else:
+                cursor.execute(sql)
+            result = cursor.fetchall()
+            cursor.close()
+        if self.stats != None:
+            self.stats.record(sql, time.perf_counter() - start, len(result), params)
+        return result
+
+    @contextmanager
+    def query_iter(
+        self, sql: str, params=None, arraysize: int = 0
+    ) -> Iterator[Iterator[Any]]:
+        """Execute a query and yields an iterator over the resulting rows
+
+        Rows are fetched in chunks of arraysize rows, so memory depends on
+        arraysize instead of the total number of rows
+
+        The connection is kept until the with block ends, also when the rows
+        are not read to the end. Don't keep the iterator after the block.
+            with db.query_iter(sql) as rows:
+                for row in rows:
+                    ...
+
+        sql = query to execute,
+        params = dictionary for parameters in query
+        arraysize = nr of rows per fetch, default from config
+        return value = iterator over fetched rows
+        """
+        log.debug("DB query iter: %s, %s", sql, params)
+        # Only time spent in sqlite is counted, not the time of the consumer
+        elapsed = [0.0]
+        nr_rows = [0]
+
+        def fetch_rows(cursor: sqlite3.Cursor) -> Iterator[Any]:
+            while True:
+                start = time.perf_counter()
+                rows = cursor.fetchmany()
+                elapsed[0] += time.perf_counter() - start
+                if not rows:
+                    break
+                nr_rows[0] += len(rows)
+                yield from rows
+
+        with self._read_connection() as conn:
+            start = time.perf_counter()
+            cursor = conn.cursor()
+            cursor.arraysize = arraysize if arraysize > 0 else config.DB_FETCH_ARRAYSIZE
+            try:
+                if params:
+                    cursor.execute(sql, params)
+                else:
+                    cursor.execute(sql)
+                elapsed[0] += time.perf_counter() - start
+                yield fetch_rows(cursor)
+            finally:
+                cursor.close()
+                if self.stats != None:
+                    self.stats.record(sql, elapsed[0], nr_rows[0], params)
+
+    def query_in(
+        self, sql: str, values: Iterable, params: tuple = (), chunk_size: int = 0
+    ) -> list[Any]:
+        """Execute a query with an IN list for many values and returns the result
+
+        The values are queried in chunks, the result of all chunks is combined
+
+        sql = query to execute, {in} is replaced by the placeholders of a chunk,
+              can be used more than once, every time the same values are used
+        values = values for the IN list
+        params = parameters in query before the first IN list
+        chunk_size = nr of values per query, default from config
+        return value = fetched data from all queries
+        """
+        if chunk_size <= 0:
+            chunk_size = config.DB_IN_CHUNK_SIZE
+        nr_in = sql.count("{in}")
+        result: list[Any] = []
+        values_iter = iter(values)
+        while True:
+            chunk = list(islice(values_iter, chunk_size))
+            if not chunk:
+                break
+            placeholders = ",".join("?" * len(chunk))
+            result.extend(
+                self.query(sql.replace("{in}", placeholders), (*params, *chunk * nr_in))
+            )
         return result
 
     def executescript(self, script: str) -> int:
-        """Execute a script (must have COMMIT;)"""
+        """Execute a script (must have COMMIT;)
+
+        Not allowed inside a unit of work, sqlite commits before running a script
+        """
+        if self.in_transaction():
+            raise DbError("Not allowed to execute a script inside a transaction")
         max_chars = config.MAX_CHAR_LOG_SCRIPT_LENGHT
         log.debug(
             f"DB script start: {script[:max_chars]}"
             f"{'...' if len(script)>max_chars else ''}"
         )
-        cursor = self.conn.cursor()
-        cursor.executescript(script)
-        result = self.conn.total_changes
+        with self.write_lock:
+            cursor = self.conn.cursor()
+            cursor.executescript(script)
+            result = self.conn.total_changes
+            self._set_dirty()
         log.debug(f"DB script end, Total changes: {result}")
         return result
 
+    @contextmanager
+    def transaction(self) -> Iterator["Db"]:
+        """Unit of work, all statements inside are committed at once
+
+        Calls to commit() inside the with block are deferred until the
+        outermost block ends. On an exception everything is rolled back.
+        Nested blocks use a savepoint, so an inner block can fail without
+        discarding the work of the outer block.
+        """
+        with self.write_lock:
+            depth = self.transaction_depth()
+            savepoint = f"uow_{depth}"
+            if depth == 0:
+                if not self.conn.in_transaction:
+                    self.conn.execute("BEGIN")
+            else:
+                self.conn.execute(f"SAVEPOINT {savepoint}")
+            self.local.transaction_depth = depth + 1
+            try:
+                yield self
+            except BaseException:
+                self.local.transaction_depth = depth
+                if depth == 0:
+                    self.rollback()
+                else:
+                    self.conn.execute(f"ROLLBACK TO {savepoint}")
+                    self.conn.execute(f"RELEASE {savepoint}")
+                    self._run_rollback_hooks()
+                raise
+            self.local.transaction_depth = depth
+            if depth == 0:
+                self.commit()
+            else:
+                self.conn.execute(f"RELEASE {savepoint}")
+
+    def transaction_depth(self) -> int:
+        """Nr of nested transaction() blocks of the current thread"""
+        return getattr(self.local, "transaction_depth", 0)
+
+    def in_transaction(self) -> bool:
+        """True when the current thread is inside a unit of work started with transaction()"""
+        return self.transaction_depth() > 0
+
     def commit(self):
-        self.conn.commit()
+        if self.in_transaction():
+            # Unit of work commits at the end of the transaction block
+            return
+        with self.write_lock:
+            self.conn.commit()
+            self._clear_dirty()
 
     def rollback(self):
         log.debug(f"DB Rollback start")
-        self.conn.rollback()
+        with self.write_lock:
+            self.conn.rollback()
+            self._clear_dirty()
+        self._run_rollback_hooks()
         log.debug(f"DB Rollback ready")
 
     def has_connection(self):
@@ -0,0 +1,162 @@
+"""
+@author: Arno
+@created: 2026-10-17
+@modified: 2026-10-17
+
+Cache for the resolution of addresses to wallet ids during ingest
+
+"""
+import logging
+import threading
+from collections import OrderedDict
+from typing import Iterable
+from weakref import WeakKeyDictionary
+
+import config
+from src.db.db import Db
+
+log = logging.getLogger(__name__)
+
+# (address, site_id, profile_id)
+AddressKey = tuple[str, int, int]
+# (wallet_id, walletchild_id), walletchild_id is 0 for a wallet address
+WalletIds = tuple[int, int]
+
+
+class AddressCache:
+    """Bounded LRU cache of address to (wallet_id, walletchild_id)
+
+    constructor:
+        maxsize(int): maximum number of addresses, least recently used is removed
+    usage:
+        cache = get_address_cache(db)
+        cache.warm(db, siteid, profileid)
+        ids = cache.get((address, siteid, profileid))
+        cache.invalidate_addresses([address])
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self.entries: OrderedDict[AddressKey, WalletIds] = OrderedDict()
+        self.warmed: set[tuple[int, int]] = set()
+        # (site_id, profile_id) of all cached keys, to find an address quickly
+        self.scopes: set[tuple[int, int]] = set()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: AddressKey) -> WalletIds | None:
+        with self.lock:
+            ids = self.entries.get(key)
+            if ids == None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return ids
+
+    def put(self, key: AddressKey, ids: WalletIds) -> None:
+        with self.lock:
+            self._put(key, ids)
+
+    def _put(self, key: AddressKey, ids: WalletIds) -> None:
+        self.scopes.add(key[1:])
+        self.entries[key] = ids
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def warm(self, db: Db, siteid: int, profileid: int) -> None:
+        """Load all wallet and child addresses of a site and profile at once
+
+        Only done once per site and profile, until the cache is cleared
+        Addresses found more than once are not cached, the lookup in the
+        database reports that error
+        """
+        if (siteid, profileid) in self.warmed:
+            return
+        query = """SELECT address, id, 0 FROM wallet
+                WHERE site_id=? AND profile_id=?
+                UNION ALL
+                SELECT walletchild.address, parent_id, walletchild.id FROM walletchild
+                INNER JOIN wallet ON walletchild.parent_id==wallet.id
+                WHERE wallet.site_id=? AND wallet.profile_id=?;"""
+        queryargs = (siteid, profileid, siteid, profileid)
+        wallets: dict[str, WalletIds] = {}
+        children: dict[str, list[WalletIds]] = {}
+        with db.query_iter(query, queryargs) as rows:
+            for address, walletid, walletchildid in rows:
+                if walletchildid == 0:
+                    # Wallet address has priority over a child address
+                    wallets[address] = (
+                        (0, 0) if address in wallets else (walletid, walletchildid)
+                    )
+                else:
+                    children.setdefault(address, []).append((walletid, walletchildid))
+        for address, ids in children.items():
+            if address not in wallets:
+                wallets[address] = ids[0] if len(ids) == 1 else (0, 0)
+        with self.lock:
+            for address, ids in wallets.items():
+                if ids != (0, 0):
+                    self._put((address, siteid, profileid), ids)
+            self.warmed.add((siteid, profileid))
+        log.debug(
+            f"Address cache warmed with {len(wallets)} addresses for site {siteid} and profile {profileid}"
+        )
+
+    def invalidate_addresses(self, addresses: Iterable[str]) -> None:
+        """Remove addresses for all sites and profiles"""
+        with self.lock:
+            for address in addresses:
+                for siteid, profileid in self.scopes:
+                    self.entries.pop((address, siteid, profileid), None)
+
+    def invalidate_wallet(self, walletid: int) -> None:
+        """Remove all addresses of a wallet and its childs"""
+        with self.lock:
+            for key in [k for k, ids in self.entries.items() if ids[0] == walletid]:
+                del self.entries[key]
+
+    def invalidate_walletchild(self, walletchildid: int) -> None:
+        """Remove the address of a child wallet"""
+        with self.lock:
+            for key in [
+                k for k, ids in self.entries.items() if ids[1] == walletchildid
+            ]:
+                del self.entries[key]
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.warmed.clear()
+            self.scopes.clear()
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+    def log_stats(self) -> None:
+        log.info(
+            f"Address cache: {len(self.entries)} addresses, {self.hits} hits, "
+            f"{self.misses} misses, hit ratio {self.hit_ratio:.1%}"
+        )
+
+
+_caches: WeakKeyDictionary[Db, AddressCache] = WeakKeyDictionary()
+_caches_lock = threading.Lock()
+
+
+def get_address_cache(db: Db) -> AddressCache:
+    """Address cache of the database, created at first use
+
+    Cleared when the database does a rollback, cached ids might not exist anymore
+    """
+    with _caches_lock:
+        cache = _caches.get(db)
+        if cache == None:
+            cache = AddressCache(config.ADDRESS_CACHE_SIZE)
+            _caches[db] = cache
+            db.add_rollback_hook(cache.clear)
+        return cache
@@ -1,15 +1,17 @@
 """
 @author: Arno
 @created: 2023-07-01
-@modified: 2023-08-25
+@modified: 2026-10-17
 
 Database Handler Class
 
 """
 import logging
+from typing import Iterable
 
 from src.data.dbschemadata import Asset
 from src.db.db import Db
+from src.db.dbrefcache import get_ref_cache
 from src.errors.dberrors import DbError
 
 log = logging.getLogger(__name__)
@@ -30,16 +32,15 @@ def insert_asset(db: Db, asset: Asset) -> None:
     queryargs = (asset.name, asset.symbol, asset.decimal_places, asset.chain)
     db.execute(query, queryargs)
     db.commit()
+    get_ref_cache(db).invalidate()
 
 
 def check_symbol_exists(db: Db, asset: Asset) -> bool:
     """Checks if asset symbol exists with different name in db"""
-    query = "SELECT id FROM asset WHERE name<>? AND symbol=? AND chain=?;"
-    queryargs = (asset.name, asset.symbol, asset.chain)
-    result = db.query(query, queryargs)
-    if len(result) == 0:
-        return False
-    return True
+    for _, name, symbol, _, chain in get_ref_cache(db).get_assets(db):
+        if name != asset.name and symbol == asset.symbol and chain == asset.chain:
+            return True
+    return False
 
 
 def check_asset_exists(db: Db, asset: Asset) -> bool:
@@ -60,23 +61,30 @@ def get_asset_id(db: Db, name: str, chain: str = "") -> int:
 
 
 def get_asset_ids(db: Db, name: str, chain: str = ""):
-    query = "SELECT id FROM asset WHERE (name=? OR symbol=?) AND chain=?;"
-    queryargs = (name, name, chain)
-    result = db.query(query, queryargs)
-    return result
+    """Get ids of assets with name or symbol, from the reference cache"""
+    return [(id,) for id in get_ref_cache(db).get_asset_ids(db, name, chain)]
+
+
+def get_asset_ids_names(
+    db: Db, names: Iterable[str], chain: str = ""
+) -> dict[str, list[int]]:
+    """Get asset ids for many names or symbols at once
+
+    Returns for every name the list of asset ids with that name or symbol
+    """
+    refcache = get_ref_cache(db)
+    return {name: refcache.get_asset_ids(db, name, chain) for name in set(names)}
 
 
 def get_asset(db: Db, id: int) -> Asset:
-    query = "SELECT id, name, symbol, decimal_places, chain FROM asset WHERE id=?;"
-    queryargs = (id,)
-    result = db.query(query, queryargs)
+    result = get_ref_cache(db).get_asset(db, id)
     log.debug(f"Record of asset id {id} in database: {result}")
-    if len(result) == 0:
+    if result == None:
         raise DbError(f"No record found of asset id: {id} in database")
     return Asset(
-        id=result[0][0],
-        name=result[0][1],
-        symbol=result[0][2],
-        decimal_places=result[0][3],
-        chain=result[0][4],
+        id=result[0],
+        name=result[1],
+        symbol=result[2],
+        decimal_places=result[3],
+        chain=result[4],
     )
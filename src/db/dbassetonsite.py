@@ -1,7 +1,7 @@
 """
 @author: Arno
 @created: 2023-07-03
-@modified: 2023-08-10
+@modified: 2026-10-17
 
 Database Handler Class
 
@@ -10,6 +10,7 @@ import logging
 
 from src.data.dbschemadata import Asset, AssetOnSite, Site
 from src.db.db import Db
+from src.db.dbrefcache import get_ref_cache
 from src.errors.dberrors import DbError
 
 log = logging.getLogger(__name__)
@@ -30,6 +31,7 @@ def insert_assetonsite(db: Db, assetonsite: AssetOnSite) -> None:
     )
     db.execute(query, queryargs)
     db.commit()
+    get_ref_cache(db).invalidate()
 
 
 def check_assetonsite_exists(db: Db, assetonsite: AssetOnSite) -> bool:
@@ -41,9 +43,8 @@ def check_assetonsite_exists(db: Db, assetonsite: AssetOnSite) -> bool:
 
 
 def get_assetonsite_ids(db: Db, assetonsite: AssetOnSite):
-    query = (
-        "SELECT id FROM assetonsite WHERE asset_id=? AND site_id=? AND id_on_site=?;"
+    """Get ids of asset on site, from the reference cache"""
+    ids = get_ref_cache(db).get_assetonsite_ids(
+        db, assetonsite.asset.id, assetonsite.site.id, assetonsite.id_on_site
     )
-    queryargs = (assetonsite.asset.id, assetonsite.site.id, assetonsite.id_on_site)
-    result = db.query(query, queryargs)
-    return result
+    return [(id,) for id in ids]
@@ -0,0 +1,122 @@
+"""
+@author: Arno
+@created: 2026-10-17
+@modified: 2026-10-17
+
+Ingest benchmark of the data layer
+
+A file database is prefilled with N transactions and N/10 child addresses.
+Next new transactions are ingested like a page of a site model, with
+process_and_insert_rawtransactions per batch of DB_COMMIT_BATCH_SIZE.
+Without the indexes (before), all secondary indexes are dropped, the lookup
+indexes of migration 2 (idx_...) and the unique indexes of migration 3
+(uq_...). That is the schema of before these migrations. Without them the
+time per txn grows with the size of the tables, with the indexes it stays flat.
+
+usage:
+    python -m src.db.dbbenchmark [N ...]
+    default N is 10000, 100000 and 1000000, with and without the indexes
+
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+import config
+from src.data.dbschemadata import Site, TransactionRaw
+from src.data.dbschematypes import SiteType, TransactionType
+from src.db.db import Db
+from src.db.dbinit import db_init
+from src.db.dbtransaction import insert_transactions_raw_bulk
+from src.srv.serverhelper2 import process_and_insert_rawtransactions
+
+
+def _prefill(db: Db, nr_txns: int) -> int:
+    """Profile, site, asset, an owned and an unknowns wallet, child addresses
+    and nr_txns transactions. Returns the nr of child addresses"""
+    db.execute("INSERT INTO profile (name) VALUES ('p')")
+    db.execute("INSERT OR IGNORE INTO site VALUES (1,'Bitcoin',1,'','',0,1)")
+    db.execute(
+        "INSERT INTO asset (name,symbol,decimal_places,chain) "
+        "VALUES ('Bitcoin','BTC',8,'')"
+    )
+    db.execute(
+        "INSERT INTO wallet (site_id,profile_id,name,address,addresstype,owned,enabled,haschild) "
+        "VALUES (1,1,'x','xpub',3,1,1,1)"
+    )
+    db.execute(
+        "INSERT INTO wallet (site_id,profile_id,name,address,addresstype,owned,enabled,haschild) "
+        "VALUES (1,1,'u','Unknowns Bitcoin',2,0,0,1)"
+    )
+    nr_childs = max(nr_txns // 10, 100)
+    # odd child addresses are owned, even ones are of the unknowns wallet
+    db.executemany(
+        "INSERT INTO walletchild (parent_id,address,type,used) VALUES (?,?,?,?)",
+        ((1 if i % 2 else 2, f"child{i}", 1, 1) for i in range(nr_childs)),
+    )
+    insert_transactions_raw_bulk(
+        db,
+        (
+            (1, 1, 399, i, f"tx{i}", 2, 2 + (i % nr_childs) // 2 * 2, 1)
+            + (1 + (i % nr_childs) // 2 * 2, 1, None, 1, 1000, 10, "")
+            for i in range(nr_txns)
+        ),
+    )
+    db.commit()
+    return nr_childs
+
+
+def benchmark(nr_txns: int, nr_new: int = 1000, indexes: bool = True) -> float:
+    """Milliseconds per ingested txn on a database with nr_txns transactions"""
+    with tempfile.TemporaryDirectory() as folder:
+        db = Db(dict(config.DB_CONFIG, dbname=os.path.join(folder, "bench.db")))
+        db_init(db)
+        if not indexes:
+            for (name,) in db.query(
+                "SELECT name FROM sqlite_master WHERE type='index' "
+                "AND (name LIKE 'idx_%' OR name LIKE 'uq_%')"
+            ):
+                db.execute(f"DROP INDEX {name}")
+            db.commit()
+        nr_childs = _prefill(db, nr_txns)
+        site = Site(id=1, name="Bitcoin", sitetype=SiteType.BLOCKCHAIN)
+        owned = [f"child{i}" for i in range(1, nr_childs, 2)]
+        rnd = random.Random(nr_txns)
+        txns = [
+            TransactionRaw(
+                timestamp=nr_txns + i,
+                txid=f"new{i}",
+                from_wallet=f"child{rnd.randrange(0, nr_childs, 2)}",
+                to_wallet=rnd.choice(owned),
+                quantity=1,
+                fee=1,
+                transactiontype=TransactionType.IN_UNDEFINED,
+                quote_asset="BTC",
+                fee_asset="BTC",
+            )
+            for i in range(nr_new)
+        ]
+        batch_size = config.DB_COMMIT_BATCH_SIZE
+        start = time.perf_counter()
+        for i in range(0, len(txns), batch_size):
+            with db.transaction():
+                process_and_insert_rawtransactions(
+                    db, txns[i : i + batch_size], 1, site
+                )
+        elapsed = time.perf_counter() - start
+        db.close()
+    return elapsed / nr_new * 1000
+
+
+def main(sizes: list[int]) -> None:
+    print(f"{'N':>10} {'without indexes':>16} {'with indexes':>16}")
+    for nr_txns in sizes:
+        without = benchmark(nr_txns, indexes=False)
+        with_indexes = benchmark(nr_txns, indexes=True)
+        print(f"{nr_txns:>10} {without:>10.3f} ms/txn {with_indexes:>10.3f} ms/txn")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 100000, 1000000])
@@ -1,12 +1,15 @@
 """
 @author: Arno
 @created: 2023-05-19
-@modified: 2023-09-15
+@modified: 2026-10-17
 
 Database Handler Class
 
 """
 import logging
+import sqlite3
+import time
+from typing import Callable
 
 from src.data.dbschematypes import (
     ChildAddressType,
@@ -15,7 +18,14 @@ from src.data.dbschematypes import (
     WalletAddressType,
 )
 from src.db.db import Db
-from src.db.schema import DB_SCRIPT_CREATE_TABLES
+from src.db.schema import (
+    DB_MIGRATION_1,
+    DB_MIGRATION_2,
+    DB_MIGRATION_3,
+    DB_MIGRATION_4,
+    DB_MIGRATION_5,
+    DB_MIGRATION_6,
+)
 from src.errors.dberrors import DbError
 
 log = logging.getLogger(__name__)
@@ -23,22 +33,49 @@ log = logging.getLogger(__name__)
 
 def db_init(db: Db) -> None:
     db_connect(db)
-    _getversion(db)
-    _postconnect(db)
+    version = _getversion(db)
+    if version < MIGRATIONS[-1][0]:
+        _migrate(db, version)
 
 
 def db_connect(db: Db) -> None:
     db.open()
+    check_db_settings(db)
+
+
+def check_db_settings(db: Db) -> dict:
+    """Report the effective database settings
+
+    Warns when a setting from the performance profile is not applied,
+    for example WAL is not possible for an in memory database
+    """
+    wanted: dict = db.config.get("pragmas", {})
+    settings = db.get_settings()
+    log.info(f"Database settings: {settings}")
+    for name, value in wanted.items():
+        effective = settings.get(name)
+        if (
+            str(value).lower() != str(effective).lower()
+            and PRAGMA_VALUES.get(name, {}).get(str(value).upper()) != effective
+        ):
+            log.warning(
+                f"Database setting {name} is {effective}, configured value {value}"
+            )
+    return settings
 
 
 def _getversion(db: Db) -> int:
     """Get latest Db version and status"""
-    if not check_table(db, "version"):
+    query = "SELECT id, status FROM version ORDER BY id DESC LIMIT 1"
+    try:
+        res = db.query(query)
+    except sqlite3.OperationalError as e:
+        if "no such table" not in str(e):
+            raise
         log.debug("No version table found")
         return 0
-
-    query = "SELECT id, status FROM version ORDER BY id DESC LIMIT 1"
-    res = db.query(query)
+    if len(res) == 0:
+        return 0
     (id, status) = res[0]
     if status == 0:
         raise DbError(f"Database migration not correctly upgraded. Version: {id}")
@@ -46,23 +83,54 @@ def _getversion(db: Db) -> int:
     return id
 
 
-def _postconnect(db: Db) -> None:
-    log.debug("Start script to create tables")
-    db.executescript(DB_SCRIPT_CREATE_TABLES)
+def _migrate(db: Db, version: int) -> None:
+    """Upgrade the database from version to the latest version
+    Every migration runs in one transaction, including its version record
+    """
+    for id, name, version_date, steps in MIGRATIONS:
+        if id <= version:
+            continue
+        log.info(f"Database migration to version {id}: {name}")
+        start = int(time.time())
+        with db.transaction():
+            for step in steps:
+                if isinstance(step, str):
+                    for statement in _split_statements(step):
+                        db.execute(statement)
+                else:
+                    step(db)
+            db.execute(DB_INSERT_VERSION, (id, name, version_date, start))
+        log.info(f"Database migration to version {id} ready")
+
+
+def _split_statements(script: str) -> list[str]:
+    """Split a sql script in single statements"""
+    statements: list[str] = []
+    statement = ""
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            statements.append(statement.strip())
+            statement = ""
+    if statement.strip() != "":
+        statements.append(statement.strip())
+    return statements
+
+
+def _insert_enum_types(db: Db) -> None:
+    """Insert rows for all enum data types
+    When an enum gets a new value, add a migration with this step"""
     _insert_site_types(db)
     _insert_transaction_types(db)
     _insert_walletaddress_types(db)
     _insert_walletchildaddress_types(db)
-    db.execute(DB_UPDATE_VERSION, (1,))
-    db.commit()
 
 
 def _insert_site_types(db: Db) -> None:
     """Insert rows according to enum data type"""
     log.debug("Start inserting enumeration of SiteType to database")
     DB_INSERT_TYPE = "INSERT OR IGNORE INTO sitetype VALUES (?, ?);"
-    for type in SiteType:
-        db.execute(DB_INSERT_TYPE, (type.value, type.name))
+    db.executemany(DB_INSERT_TYPE, ((type.value, type.name) for type in SiteType))
     db.commit()
 
 
@@ -70,13 +138,15 @@ def _insert_transaction_types(db: Db) -> None:
     """Insert rows according to enum data type"""
     log.debug("Start inserting enumeration of TransactionType to database")
     DB_INSERT_TYPE = "INSERT OR IGNORE INTO transactiontype VALUES (?, ?, ?);"
+    rows: list[tuple] = []
     for type in TransactionType:
         type_name = type.name.split("_", 1)
         if len(type_name) <= 1:
             raise DbError(
                 f"Unable to initiate transaction type {type.value}:{type.name}"
             )
-        db.execute(DB_INSERT_TYPE, (type.value, type_name[0], type_name[1]))
+        rows.append((type.value, type_name[0], type_name[1]))
+    db.executemany(DB_INSERT_TYPE, rows)
     db.commit()
 
 
@@ -84,8 +154,9 @@ def _insert_walletaddress_types(db: Db) -> None:
     """Insert rows according to enum data type"""
     log.debug("Start inserting enumeration of WalletAddressType to database")
     DB_INSERT_TYPE = "INSERT OR IGNORE INTO walletaddresstype VALUES (?, ?);"
-    for type in WalletAddressType:
-        db.execute(DB_INSERT_TYPE, (type.value, type.name))
+    db.executemany(
+        DB_INSERT_TYPE, ((type.value, type.name) for type in WalletAddressType)
+    )
     db.commit()
 
 
@@ -93,8 +164,9 @@ def _insert_walletchildaddress_types(db: Db) -> None:
     """Insert rows according to enum data type"""
     log.debug("Start inserting enumeration of ChildAddressType to database")
     DB_INSERT_TYPE = "INSERT OR IGNORE INTO childaddresstype VALUES (?, ?);"
-    for type in ChildAddressType:
-        db.execute(DB_INSERT_TYPE, (type.value, type.name))
+    db.executemany(
+        DB_INSERT_TYPE, ((type.value, type.name) for type in ChildAddressType)
+    )
     db.commit()
 
 
@@ -113,7 +185,25 @@ def check_table(db: Db, table_name: str) -> bool:
     return False
 
 
+# Names of pragma values, as returned by sqlite when reading the pragma
+PRAGMA_VALUES = {
+    "synchronous": {"OFF": 0, "NORMAL": 1, "FULL": 2, "EXTRA": 3},
+    "temp_store": {"DEFAULT": 0, "FILE": 1, "MEMORY": 2},
+    "foreign_keys": {"OFF": 0, "ON": 1},
+}
+
 # strftime('%s','now') instead of unixepoch() used for unix epoch timestamp
-DB_UPDATE_VERSION = f"""
-UPDATE version SET migration_timestamp_end = strftime('%s', 'now'), status = 1 WHERE id = ? AND status = 0;
+DB_INSERT_VERSION = f"""
+INSERT INTO version VALUES (?, ?, strftime('%s', ?), ?, strftime('%s', 'now'), 1);
 """
+
+# Ordered list of migrations: (version id, name, version date, steps)
+# A step is a sql script or a function with the database as argument
+MIGRATIONS: list[tuple[int, str, str, list[str | Callable[[Db], None]]]] = [
+    (1, "1 - Initial", "2023-05-15", [*DB_MIGRATION_1, _insert_enum_types]),
+    (2, "2 - Ingest indexes", "2026-10-17", [*DB_MIGRATION_2]),
+    (3, "3 - Natural keys", "2026-10-17", [*DB_MIGRATION_3]),
+    (4, "4 - Query plan indexes", "2026-10-17", [*DB_MIGRATION_4]),
+    (5, "5 - Scraping per address", "2026-10-17", [*DB_MIGRATION_5]),
+    (6, "6 - Derivation cursor", "2026-10-17", [*DB_MIGRATION_6]),
+]
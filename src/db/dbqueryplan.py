@@ -0,0 +1,396 @@
+"""
+@author: Arno
+@created: 2026-10-17
+@modified: 2026-10-17
+
+Query plan check of the sql statements of the data layer
+
+Every registered helper is called against a temporary file database with
+the latest schema, some seeded rows and read-only connections, like the
+server uses it. A write that lands on a read-only connection fails the check. The statements are captured and the
+EXPLAIN QUERY PLAN of each statement is checked. A full SCAN of a large
+table fails the check, the lookups must use an index SEARCH.
+
+usage:
+    python -m src.db.dbqueryplan
+    exit code 1 when a statement scans a large table
+
+"""
+import logging
+import os
+import re
+import sys
+import tempfile
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from src.data.dbschemadata import (
+    Asset,
+    AssetOnSite,
+    Profile,
+    Site,
+    Wallet,
+    WalletChild,
+)
+from src.data.dbschematypes import ChildAddressType, SiteType
+from src.db.db import Db
+from src.db.dbaddresscache import AddressCache
+from src.db.dbasset import (
+    check_asset_exists,
+    check_symbol_exists,
+    get_asset,
+    get_asset_id,
+    get_asset_ids_names,
+    insert_asset,
+)
+from src.db.dbassetonsite import get_assetonsite_ids, insert_assetonsite
+from src.db.dbinit import db_init
+from src.db.dbprofile import get_profile, insert_profile, update_profile
+from src.db.dbrefcache import get_ref_cache
+from src.db.dbscrapingaddress import get_scrapingaddresses, upsert_scrapingaddress_raw
+from src.db.dbscrapingtxn import (
+    check_scrapingtxn_exists_raw,
+    get_scrapingtxn_ids,
+    insert_ignore_scrapingtxn_raw,
+    update_scrapingtxn_raw,
+)
+from src.db.dbsitemodel import get_sitemodel, insert_sitemodel, update_sitemodel
+from src.db.dbtransaction import (
+    check_transaction_exists,
+    get_db_transactions,
+    get_transaction_ids,
+    get_transaction_keys,
+    insert_transaction_raw,
+    insert_transactions_raw_bulk,
+    update_transaction_child_to_wallet,
+)
+from src.db.dbwallet import (
+    get_all_active_wallets,
+    get_db_wallets,
+    get_wallet,
+    get_wallet_id_raw,
+    get_wallet_id_unknowns,
+    get_wallet_ids,
+    get_wallet_ids_addresses,
+    insert_wallet_raw,
+    update_wallet,
+)
+from src.db.dbwalletchild import (
+    check_walletchild_exists,
+    delete_walletchild_id,
+    get_nr_walletchildtypes,
+    get_walletchild,
+    get_walletchild_id,
+    get_walletchild_ids,
+    get_walletchilds,
+    get_walletchildtypes,
+    insert_walletchild_raw,
+    insert_walletchildren_bulk,
+    update_child_of_wallet_unkowns,
+    upsert_walletchild_raw,
+)
+from src.db.dbwalletderivation import (
+    advance_derivation_index_raw,
+    get_derivation_index,
+)
+from src.srv.serverhelper2 import (
+    get_walletchild_ids_join,
+    get_walletchild_ids_join_addresses,
+)
+
+log = logging.getLogger(__name__)
+
+# Tables that grow with the number of transactions and addresses
+LARGE_TABLES = (
+    "transactions",
+    "walletchild",
+    "wallet",
+    "scrapingtxn",
+    "scrapingaddress",
+    "walletderivation",
+)
+
+# Helpers that are allowed to scan a table, reading (almost) all rows by design
+ALLOWED_SCANS: dict[str, tuple[str, ...]] = {
+    "get_all_active_wallets": ("wallet",),
+}
+
+# Statements without a query plan worth checking
+SKIP_STATEMENTS = ("BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE", "PRAGMA")
+
+RE_TABLE_ALIAS = re.compile(
+    r"\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+AS\s+(\w+))?", re.IGNORECASE
+)
+RE_SCAN = re.compile(r"^SCAN (\w+)")
+
+
+@dataclass
+class QueryPlan:
+    """Query plan of one statement executed by a helper"""
+
+    name: str
+    sql: str
+    plan: list[str] = field(default_factory=list)
+    scans: list[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return len(self.scans) == 0
+
+
+def _seed(db: Db) -> None:
+    """Minimal rows, so the helpers find something and do not raise"""
+    db.execute("INSERT INTO profile (id, name, password, enabled) VALUES (1,'p',' ',1)")
+    db.execute(
+        "INSERT INTO site (id, name, sitetype_id, api, secret, hasprice, enabled) "
+        "VALUES (1,'site',1,'','',0,1)"
+    )
+    db.execute(
+        "INSERT INTO asset (id, name, symbol, decimal_places, chain) "
+        "VALUES (1,'bitcoin','btc',8,'bitcoin')"
+    )
+    insert_wallet_raw(db, 1, 1, "owned", "addr1", 1, True, True, True)
+    insert_wallet_raw(db, 1, 1, "unknowns", "", 0, False, True, True)
+    insert_walletchild_raw(db, 1, "child1", 1, True)
+    insert_ignore_scrapingtxn_raw(db, 1, 0, 0)
+    db.commit()
+
+
+def _check_asset_exists(db: Db) -> bool:
+    # Assets are read from the reference cache, read the tables again
+    get_ref_cache(db).invalidate()
+    return check_asset_exists(db, Asset("bitcoin", "btc", 8, "bitcoin", id=1))
+
+
+def _get_db_transactions(db: Db) -> list[tuple]:
+    with get_db_transactions(db, 1) as rows:
+        return list(rows)
+
+
+def _registered() -> list[tuple[str, Callable[[Db], Any]]]:
+    """All helpers with sql, called with arguments matching the seeded rows"""
+    profile = Profile("p", id=1)
+    site = Site(1, "site", SiteType.BLOCKCHAIN)
+    asset = Asset("bitcoin", "btc", 8, "bitcoin", id=1)
+    wallet = Wallet(profile, site, "owned", "addr1", id=1)
+    child = WalletChild(wallet, True, "child2", ChildAddressType.RECEIVING)
+    txn_row = (1, 1, 1, 1, "txid2", 2, None, 1, 1, 1, None, None, 1, 0, "")
+    return [
+        ("insert_profile", lambda db: insert_profile(db, "p2")),
+        ("get_profile", lambda db: get_profile(db, "p")),
+        ("update_profile", lambda db: update_profile(db, profile)),
+        ("insert_sitemodel", lambda db: insert_sitemodel(db, site)),
+        ("get_sitemodel", lambda db: get_sitemodel(db, 1)),
+        ("update_sitemodel", lambda db: update_sitemodel(db, site)),
+        ("insert_asset", lambda db: insert_asset(db, Asset("eth", "eth", 18, "eth"))),
+        ("check_symbol_exists", lambda db: check_symbol_exists(db, asset)),
+        ("check_asset_exists", _check_asset_exists),
+        ("get_asset_id", lambda db: get_asset_id(db, "btc", "bitcoin")),
+        ("get_asset", lambda db: get_asset(db, 1)),
+        (
+            "get_asset_ids_names",
+            lambda db: get_asset_ids_names(db, ["btc", "eth"], "bitcoin"),
+        ),
+        (
+            "insert_assetonsite",
+            lambda db: insert_assetonsite(db, AssetOnSite(asset, site, "btc")),
+        ),
+        (
+            "get_assetonsite_ids",
+            lambda db: get_assetonsite_ids(db, AssetOnSite(asset, site, "btc")),
+        ),
+        (
+            "insert_wallet_raw",
+            lambda db: insert_wallet_raw(db, 1, 1, "w", "addr2"),
+        ),
+        ("get_wallet_ids", lambda db: get_wallet_ids(db, wallet)),
+        ("get_wallet_id_raw", lambda db: get_wallet_id_raw(db, "addr1", 1, 1)),
+        (
+            "get_wallet_ids_addresses",
+            lambda db: get_wallet_ids_addresses(db, ["addr1", "addr2"], 1, 1),
+        ),
+        ("get_wallet_id_unknowns", lambda db: get_wallet_id_unknowns(db, 1, 1)),
+        ("get_wallet", lambda db: get_wallet(db, 1)),
+        ("address_cache_warm", lambda db: AddressCache(10).warm(db, 1, 1)),
+        ("get_db_wallets", lambda db: list(get_db_wallets(db, 1))),
+        ("get_all_active_wallets", lambda db: list(get_all_active_wallets(db))),
+        ("update_wallet", lambda db: update_wallet(db, wallet)),
+        (
+            "insert_walletchild_raw",
+            lambda db: insert_walletchild_raw(db, 1, "child3", 1, True),
+        ),
+        (
+            "upsert_walletchild_raw",
+            lambda db: upsert_walletchild_raw(db, 2, "child4", 0, True),
+        ),
+        (
+            "insert_walletchildren_bulk",
+            lambda db: insert_walletchildren_bulk(db, [(1, "child5", 1, False)]),
+        ),
+        ("check_walletchild_exists", lambda db: check_walletchild_exists(db, "c")),
+        ("get_walletchild_id", lambda db: get_walletchild_id(db, "child1", 1)),
+        ("get_walletchild_ids", lambda db: get_walletchild_ids(db, "child1")),
+        ("get_walletchild", lambda db: get_walletchild(db, 1)),
+        ("get_walletchilds", lambda db: list(get_walletchilds(db, 1))),
+        (
+            "get_walletchildtypes",
+            lambda db: get_walletchildtypes(db, 1, ChildAddressType.RECEIVING),
+        ),
+        (
+            "get_nr_walletchildtypes",
+            lambda db: get_nr_walletchildtypes(db, 1, ChildAddressType.RECEIVING),
+        ),
+        (
+            "get_walletchild_ids_join",
+            lambda db: get_walletchild_ids_join(db, "child1", 1, 1),
+        ),
+        (
+            "get_walletchild_ids_join_addresses",
+            lambda db: get_walletchild_ids_join_addresses(db, ["child1", "c"], 1, 1),
+        ),
+        (
+            "update_child_of_wallet_unkowns",
+            lambda db: update_child_of_wallet_unkowns(db, 2, child),
+        ),
+        (
+            "insert_transaction_raw",
+            lambda db: insert_transaction_raw(
+                db, 1, 1, 1, 1, "txid1", 2, None, 1, 1, 1, None, None, 1, 0, ""
+            ),
+        ),
+        (
+            "insert_transactions_raw_bulk",
+            lambda db: insert_transactions_raw_bulk(db, [txn_row]),
+        ),
+        (
+            "check_transaction_exists",
+            lambda db: check_transaction_exists(db, "txid1", 1),
+        ),
+        (
+            "check_transaction_exists_child",
+            lambda db: check_transaction_exists(db, "txid1", 1, 1),
+        ),
+        ("get_transaction_ids", lambda db: get_transaction_ids(db, "txid1")),
+        (
+            "get_transaction_keys",
+            lambda db: get_transaction_keys(db, ["txid1", "txid2"]),
+        ),
+        ("get_db_transactions", _get_db_transactions),
+        (
+            "update_transaction_child_to_wallet",
+            lambda db: update_transaction_child_to_wallet(db, 1, 1, 2),
+        ),
+        (
+            "insert_ignore_scrapingtxn_raw",
+            lambda db: insert_ignore_scrapingtxn_raw(db, 2, 0, 0),
+        ),
+        (
+            "check_scrapingtxn_exists_raw",
+            lambda db: check_scrapingtxn_exists_raw(db, 1),
+        ),
+        ("get_scrapingtxn_ids", lambda db: get_scrapingtxn_ids(db, 1)),
+        ("update_scrapingtxn_raw", lambda db: update_scrapingtxn_raw(db, 1, 1)),
+        (
+            "upsert_scrapingaddress_raw",
+            lambda db: upsert_scrapingaddress_raw(db, 1, "child1", 1, "txid1", 1),
+        ),
+        ("get_scrapingaddresses", lambda db: get_scrapingaddresses(db, 1)),
+        (
+            "advance_derivation_index_raw",
+            lambda db: advance_derivation_index_raw(db, 1, 1, 1),
+        ),
+        (
+            "get_derivation_index",
+            lambda db: get_derivation_index(db, 1, ChildAddressType.RECEIVING),
+        ),
+        ("delete_walletchild_id", lambda db: delete_walletchild_id(db, 99)),
+    ]
+
+
+def _tables(sql: str) -> dict[str, str]:
+    """Map of table names and aliases to table names in a statement"""
+    tables: dict[str, str] = {}
+    for table, alias in RE_TABLE_ALIAS.findall(sql):
+        tables[table] = table
+        if alias:
+            tables[alias] = table
+    return tables
+
+
+def explain(db: Db, name: str, sql: str) -> QueryPlan:
+    """Query plan of a statement with the parameters filled in"""
+    result = QueryPlan(name, sql)
+    tables = _tables(sql)
+    allowed = ALLOWED_SCANS.get(name, ())
+    for _, _, _, detail in db.query(f"EXPLAIN QUERY PLAN {sql}"):
+        result.plan.append(detail)
+        scan = RE_SCAN.match(detail)
+        if scan == None:
+            continue
+        table = tables.get(scan[1], scan[1])
+        if table in LARGE_TABLES and table not in allowed:
+            result.scans.append(table)
+    return result
+
+
+def check_query_plans(dbname: str = "", readers: int = 2) -> list[QueryPlan]:
+    """Run all registered helpers and return the query plans of their statements
+
+    dbname = database to use, default a new file in a temporary folder
+    readers = nr of read-only connections, as in DB_CONFIG
+    """
+    if dbname == "":
+        with tempfile.TemporaryDirectory() as folder:
+            return check_query_plans(os.path.join(folder, "queryplan.db"), readers)
+    db = Db({"dbname": dbname, "readers": readers})
+    db_init(db)
+    _seed(db)
+    # Open all read-only connections now, so their statements are captured too
+    with db.readers_lock:
+        nr_open = len(db.readers_open)
+    connections = [db._get_reader() for _ in range(readers - nr_open)]
+    for reader in connections:
+        db.readers.put(reader)
+    captured: list[str] = []
+    plans: list[QueryPlan] = []
+    for name, helper in _registered():
+        captured.clear()
+        for conn in [db.conn, *db.readers_open]:
+            conn.set_trace_callback(captured.append)
+        try:
+            helper(db)
+        finally:
+            for conn in [db.conn, *db.readers_open]:
+                conn.set_trace_callback(None)
+        for sql in list(captured):
+            if sql.lstrip().upper().startswith(SKIP_STATEMENTS):
+                continue
+            plans.append(explain(db, name, sql))
+    db.close()
+    return plans
+
+
+def report(plans: list[QueryPlan]) -> str:
+    """Text report with the query plan of every statement"""
+    lines: list[str] = []
+    for plan in plans:
+        status = "ok" if plan.ok else f"SCAN of {', '.join(plan.scans)}"
+        lines.append(f"{plan.name}: {status}")
+        lines.append(f"    {' '.join(plan.sql.split())}")
+        lines.extend(f"        {detail}" for detail in plan.plan)
+    failed = [plan.name for plan in plans if not plan.ok]
+    lines.append(
+        f"{len(plans)} statements checked, {len(failed)} with a scan of a large table"
+        + (f": {', '.join(failed)}" if failed else "")
+    )
+    return "\n".join(lines)
+
+
+def main() -> int:
+    plans = check_query_plans()
+    print(report(plans))
+    return 0 if all(plan.ok for plan in plans) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""
+@author: Arno
+@created: 2026-10-17
+@modified: 2026-10-17
+
+Cache for the reference data: assets, assets on site, sites and unknowns wallets
+
+"""
+import logging
+import threading
+from weakref import WeakKeyDictionary
+
+from src.data.dbschematypes import WalletAddressType
+from src.db.db import Db
+
+log = logging.getLogger(__name__)
+
+
+class RefCache:
+    """Identity map of the small reference tables
+
+    The asset, assetonsite and site tables are read at once at first use.
+    The unknowns wallet ids are read per site and profile at first use.
+    The helpers that write these tables invalidate the cache, it is read
+    again at the next use. Changes by another process are not seen.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.RLock()
+        self.loaded = False
+        # Raised by every invalidate, rows read before are not marked as loaded
+        self.version = 0
+        # id: (id, name, symbol, decimal_places, chain)
+        self.assets: dict[int, tuple] = {}
+        # (name or symbol, chain): asset ids
+        self.asset_ids: dict[tuple[str, str], list[int]] = {}
+        # (asset_id, site_id, id_on_site): assetonsite ids
+        self.assetonsite_ids: dict[tuple[int, int, str], list[int]] = {}
+        # id: (id, name, sitetype_id, api, secret, hasprice, enabled)
+        self.sites: dict[int, tuple] = {}
+        # (site_id, profile_id): unknowns wallet ids
+        self.wallet_unknowns: dict[tuple[int, int], list[int]] = {}
+
+    def load(self, db: Db) -> None:
+        """Read the asset, assetonsite and site tables
+
+        The tables are read without the lock of the cache, reading can take
+        the write lock of the database. Only the swap is done with the lock.
+        """
+        with self.lock:
+            version = self.version
+        assets: dict[int, tuple] = {}
+        asset_ids: dict[tuple[str, str], list[int]] = {}
+        assetonsite_ids: dict[tuple[int, int, str], list[int]] = {}
+        sites: dict[int, tuple] = {}
+        query = "SELECT id, name, symbol, decimal_places, chain FROM asset;"
+        for row in db.query(query):
+            id, name, symbol, _, chain = row
+            assets[id] = row
+            asset_ids.setdefault((name, chain), []).append(id)
+            if symbol != name:
+                asset_ids.setdefault((symbol, chain), []).append(id)
+        query = "SELECT id, asset_id, site_id, id_on_site FROM assetonsite;"
+        for id, assetid, siteid, idonsite in db.query(query):
+            key = (assetid, siteid, idonsite)
+            assetonsite_ids.setdefault(key, []).append(id)
+        query = """SELECT id, name, sitetype_id, api, secret, hasprice, enabled
+                FROM site;"""
+        for row in db.query(query):
+            sites[row[0]] = row
+        with self.lock:
+            self.assets = assets
+            self.asset_ids = asset_ids
+            self.assetonsite_ids = assetonsite_ids
+            self.sites = sites
+            # Invalidated while reading, read again at next use
+            self.loaded = self.version == version
+        log.debug(
+            f"Reference cache loaded: {len(assets)} assets, "
+            f"{len(assetonsite_ids)} assets on site, {len(sites)} sites"
+        )
+
+    def _check_loaded(self, db: Db) -> None:
+        while True:
+            with self.lock:
+                if self.loaded:
+                    return
+            self.load(db)
+
+    def get_asset_ids(self, db: Db, name: str, chain: str = "") -> list[int]:
+        """Asset ids with this name or symbol on the chain"""
+        self._check_loaded(db)
+        with self.lock:
+            return list(self.asset_ids.get((name, chain), []))
+
+    def get_asset(self, db: Db, id: int) -> tuple | None:
+        self._check_loaded(db)
+        with self.lock:
+            return self.assets.get(id)
+
+    def get_assets(self, db: Db) -> list[tuple]:
+        self._check_loaded(db)
+        with self.lock:
+            return list(self.assets.values())
+
+    def get_assetonsite_ids(
+        self, db: Db, assetid: int, siteid: int, idonsite: str
+    ) -> list[int]:
+        self._check_loaded(db)
+        with self.lock:
+            return list(self.assetonsite_ids.get((assetid, siteid, idonsite), []))
+
+    def get_site(self, db: Db, id: int) -> tuple | None:
+        self._check_loaded(db)
+        with self.lock:
+            return self.sites.get(id)
+
+    def get_wallet_unknowns_ids(self, db: Db, siteid: int, profileid: int) -> list[int]:
+        """Ids of the wallet for not owned addresses of a site and profile"""
+        with self.lock:
+            ids = self.wallet_unknowns.get((siteid, profileid))
+            version = self.version
+        if ids == None:
+            query = """SELECT id FROM wallet
+                    WHERE owned=false AND addresstype=? AND site_id=? AND profile_id=?;"""
+            queryargs = (WalletAddressType.UNKNOWN.value, siteid, profileid)
+            ids = [id for (id,) in db.query(query, queryargs)]
+            with self.lock:
+                if self.version == version:
+                    self.wallet_unknowns[(siteid, profileid)] = ids
+        return list(ids)
+
+    def invalidate(self) -> None:
+        """Read everything again at next use"""
+        with self.lock:
+            self.version += 1
+            self.loaded = False
+            self.wallet_unknowns.clear()
+
+    def invalidate_wallet_unknowns(self) -> None:
+        with self.lock:
+            self.version += 1
+            self.wallet_unknowns.clear()
+
+
+_caches: WeakKeyDictionary[Db, RefCache] = WeakKeyDictionary()
+_caches_lock = threading.Lock()
+
+
+def get_ref_cache(db: Db) -> RefCache:
+    """Reference cache of the database, created at first use
+
+    Invalidated when the database does a rollback, cached rows might not exist anymore
+    """
+    with _caches_lock:
+        cache = _caches.get(db)
+        if cache == None:
+            cache = RefCache()
+            _caches[db] = cache
+            db.add_rollback_hook(cache.invalidate)
+        return cache
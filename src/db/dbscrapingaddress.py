@@ -0,0 +1,43 @@
+"""
+@author: Arno
+@created: 2026-10-17
+@modified: 2026-10-17
+
+Database Handler Class
+
+"""
+import logging
+
+from src.db.db import Db
+
+log = logging.getLogger(__name__)
+
+
+def upsert_scrapingaddress_raw(
+    db: Db,
+    walletid: int,
+    address: str,
+    timestamp_end: int,
+    last_txid: str = "",
+    n_tx: int = 0,
+) -> None:
+    """Insert or update the scraping time of an address of a wallet"""
+    query = """INSERT INTO scrapingaddress 
+            (wallet_id, address, scrape_timestamp_end, last_txid, n_tx) 
+            VALUES (?,?,?,?,?)
+            ON CONFLICT (wallet_id, address) DO UPDATE SET 
+                scrape_timestamp_end=excluded.scrape_timestamp_end,
+                last_txid=excluded.last_txid, n_tx=excluded.n_tx;"""
+    queryargs = (walletid, address, timestamp_end, last_txid, n_tx)
+    db.execute(query, queryargs)
+    db.commit()
+
+
+def get_scrapingaddresses(db: Db, walletid: int) -> dict[str, tuple[int, str, int]]:
+    """Get the scraping times of all addresses of a wallet
+    Returns per address (scrape_timestamp_end, last_txid, n_tx)"""
+    query = """SELECT address, scrape_timestamp_end, last_txid, n_tx 
+            FROM scrapingaddress WHERE wallet_id=?;"""
+    queryargs = (walletid,)
+    result = db.query(query, queryargs)
+    return {address: (end, txid, n_tx) for address, end, txid, n_tx in result}
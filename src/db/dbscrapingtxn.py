@@ -1,7 +1,7 @@
 """
 @author: Arno
 @created: 2023-07-12
-@modified: 2023-08-10
+@modified: 2026-10-17
 
 Database Handler Class
 
@@ -36,30 +36,22 @@ def insert_scrapingtxn(db: Db, scrape: ScrapingTxn) -> None:
 
 
 def insert_ignore_scrapingtxn(db: Db, scrape: ScrapingTxn) -> None:
-    scrape_exists = check_scrapingtxn_exists(db, scrape.wallet)
-    if scrape_exists:
-        return
-    query = """INSERT OR IGNORE INTO scrapingtxn 
-            (wallet_id, scrape_timestamp_start, scrape_timestamp_end) 
-            VALUES (?,?,?);"""
-    queryargs = (
+    insert_ignore_scrapingtxn_raw(
+        db,
         scrape.wallet.id,
         scrape.scrape_timestamp_start,
         scrape.scrape_timestamp_end,
     )
-    db.execute(query, queryargs)
-    db.commit()
 
 
 def insert_ignore_scrapingtxn_raw(
     db: Db, walletid: int, timestamp_start: int = 0, timestamp_end: int = 0
 ) -> None:
-    scrape_exists = check_scrapingtxn_exists_raw(db, walletid)
-    if scrape_exists:
-        return
-    query = """INSERT OR IGNORE INTO scrapingtxn 
+    """Insert scraping txn for wallet, nothing is done if it already exists"""
+    query = """INSERT INTO scrapingtxn 
             (wallet_id, scrape_timestamp_start, scrape_timestamp_end) 
-            VALUES (?,?,?);"""
+            VALUES (?,?,?)
+            ON CONFLICT (wallet_id) DO NOTHING;"""
     queryargs = (
         walletid,
         timestamp_start,
@@ -1,7 +1,7 @@
 """
 @author: Arno
 @created: 2023-05-29
-@modified: 2023-08-10
+@modified: 2026-10-17
 
 Database Handler Class
 
@@ -10,6 +10,7 @@ import logging
 
 from src.data.dbschemadata import Site
 from src.db.db import Db
+from src.db.dbrefcache import get_ref_cache
 from src.errors.dberrors import DbError
 
 log = logging.getLogger(__name__)
@@ -30,16 +31,15 @@ def insert_sitemodel(db: Db, site: Site) -> None:
     )
     db.execute(query, queryargs)
     db.commit()
+    get_ref_cache(db).invalidate()
 
 
 def get_sitemodel(db: Db, id: int) -> tuple:
-    query = """SELECT id, name, sitetype_id, api, secret, hasprice, enabled 
-            FROM site WHERE id = ?;"""
-    result = db.query(query, (id,))
+    result = get_ref_cache(db).get_site(db, id)
     log.debug(f"Record of sitemodel id {id} in database: {result}")
-    if len(result) == 0:
+    if result == None:
         raise DbError(f"No record found of sitemodel id: {id} in database")
-    return result[0]
+    return result
 
 
 def update_sitemodel(db: Db, site: Site) -> None:
@@ -47,3 +47,4 @@ def update_sitemodel(db: Db, site: Site) -> None:
     queryargs = (site.api, site.secret, site.hasprice, site.enabled, site.id)
     db.execute(query, queryargs)
     db.commit()
+    get_ref_cache(db).invalidate()
@@ -0,0 +1,96 @@
+"""
+@author: Arno
+@created: 2026-10-17
+@modified: 2026-10-17
+
+Database instrumentation, timings and counts per sql statement
+
+"""
+import logging
+import threading
+from dataclasses import dataclass
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class StatementStats:
+    """Dataclass for the statistics of one normalized sql statement"""
+
+    sql: str
+    calls: int = 0
+    rows: int = 0
+    total_time: float = 0.0
+    max_time: float = 0.0
+
+    @property
+    def avg_time(self) -> float:
+        return self.total_time / self.calls if self.calls > 0 else 0.0
+
+
+def normalize_sql(sql: str) -> str:
+    """Collapse whitespace, so the same statement is counted once"""
+    return " ".join(sql.split())
+
+
+class DbStats:
+    """Collects per statement call counts, latency and rows
+
+    constructor:
+        slow_query_ms(float): log statements slower than this, 0 is off
+    usage:
+        db = Db({"dbname": ":memory:", "instrument": True, "slow_query_ms": 100})
+        ...
+        db.stats.log_summary()
+    """
+
+    def __init__(self, slow_query_ms: float = 0) -> None:
+        self.slow_query_ms = slow_query_ms
+        self.statements: dict[str, StatementStats] = {}
+        self.lock = threading.Lock()
+
+    def record(self, sql: str, elapsed: float, rows: int, params=None) -> None:
+        """Record one execution of a statement, elapsed time in seconds"""
+        key = normalize_sql(sql)
+        with self.lock:
+            stats = self.statements.get(key)
+            if stats == None:
+                stats = StatementStats(sql=key)
+                self.statements[key] = stats
+            stats.calls += 1
+            stats.rows += rows
+            stats.total_time += elapsed
+            stats.max_time = max(stats.max_time, elapsed)
+        elapsed_ms = elapsed * 1000
+        if self.slow_query_ms > 0 and elapsed_ms >= self.slow_query_ms:
+            log.warning("Slow query %.1f ms: %s, %s", elapsed_ms, key, params)
+
+    def reset(self) -> None:
+        with self.lock:
+            self.statements.clear()
+
+    def summary(self, top: int = 0) -> list[StatementStats]:
+        """Statements sorted on total time, top = 0 returns all"""
+        with self.lock:
+            result = sorted(
+                self.statements.values(), key=lambda s: s.total_time, reverse=True
+            )
+        if top > 0:
+            return result[:top]
+        return result
+
+    def log_summary(self, top: int = 20) -> None:
+        """Log the statements with the most total time"""
+        statements = self.summary()
+        total_calls = sum(s.calls for s in statements)
+        total_time = sum(s.total_time for s in statements)
+        log.info(
+            f"DB statistics: {len(statements)} statements, "
+            f"{total_calls} calls, {total_time * 1000:.1f} ms total"
+        )
+        for s in statements[:top] if top > 0 else statements:
+            log.info(
+                f"{s.calls:>8} calls {s.total_time * 1000:>10.1f} ms total "
+                f"{s.avg_time * 1000:>8.3f} ms avg {s.max_time * 1000:>8.1f} ms max "
+                f"{s.rows:>8} rows: {s.sql[:150]}"
+            )
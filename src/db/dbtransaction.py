@@ -1,12 +1,14 @@
 """
 @author: Arno
 @created: 2023-07-01
-@modified: 2023-10-27
+@modified: 2026-10-17
 
 Database Handler Class
 
 """
 import logging
+from contextlib import contextmanager
+from typing import Iterable, Iterator
 
 from src.data.dbschemadata import Transaction
 from src.db.db import Db
@@ -77,13 +79,19 @@ def insert_transaction_raw(
     fee_cents: int,
     note: str,
 ) -> int:
-    query = """INSERT OR IGNORE INTO transactions 
+    """Insert a raw transaction
+
+    Returns the id of the new transaction
+    or 0 if the transaction already exists (txid and from/to wallet)
+    """
+    query = """INSERT INTO transactions 
                     (profile_id, site_id, transactiontype_id, timestamp, txid, 
                      from_wallet_id, from_walletchild_id, 
                      to_wallet_id, to_walletchild_id,
                      quote_asset_id, base_asset_id, fee_asset_id,
                      quantity, fee, note) 
-                VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?);"""
+                VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+                ON CONFLICT DO NOTHING RETURNING id;"""
     queryargs = (
         profileid,
         siteid,
@@ -101,7 +109,29 @@ def insert_transaction_raw(
         fee_cents,
         note,
     )
-    result = db.execute(query, queryargs)
+    result = db.execute_returning(query, queryargs)
+    db.commit()
+    if len(result) == 0:
+        return 0
+    return result[0][0]
+
+
+def insert_transactions_raw_bulk(db: Db, rows: Iterable[tuple]) -> int:
+    """Insert many raw transactions at once
+
+    rows = iterable of tuples in the same order as the arguments of
+           insert_transaction_raw (profileid, siteid, ..., fee_cents, note)
+    Existing transactions (txid and from/to wallet) are skipped
+    """
+    query = """INSERT INTO transactions 
+                    (profile_id, site_id, transactiontype_id, timestamp, txid, 
+                     from_wallet_id, from_walletchild_id, 
+                     to_wallet_id, to_walletchild_id,
+                     quote_asset_id, base_asset_id, fee_asset_id,
+                     quantity, fee, note) 
+                VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+                ON CONFLICT DO NOTHING;"""
+    result = db.executemany(query, rows)
     db.commit()
     return result
 
@@ -116,7 +146,7 @@ def check_transaction_exists(
         queryargs = (txid, towalletchildid)
     else:
         # no to_walletchild
-        query = "SELECT id FROM transactions WHERE txid=? AND to_wallet_id=? AND to_walletchild_id=NULL;"
+        query = "SELECT id FROM transactions WHERE txid=? AND to_wallet_id=? AND to_walletchild_id IS NULL;"
         queryargs = (txid, towalletid)
     result = db.query(query, queryargs)
     if len(result) == 0:
@@ -131,7 +161,22 @@ def get_transaction_ids(db: Db, txid: str):
     return result
 
 
-def get_db_transactions(db: Db, profileid: int) -> list:
+def get_transaction_keys(db: Db, txids: Iterable[str]) -> set[tuple]:
+    """Get the unique keys of the existing transactions with these txids
+
+    Key is (txid, from_wallet_id, from_walletchild_id, to_wallet_id, to_walletchild_id)
+    with 0 for no child wallet, same as the unique index on transactions
+    """
+    query = """SELECT txid, from_wallet_id, IFNULL(from_walletchild_id, 0), 
+                to_wallet_id, IFNULL(to_walletchild_id, 0) 
+            FROM transactions WHERE txid IN ({in});"""
+    return set(db.query_in(query, set(txids)))
+
+
+@contextmanager
+def get_db_transactions(db: Db, profileid: int) -> Iterator[Iterator[tuple]]:
+    """Get all transactions of a profile, rows are streamed from the database
+    The connection is kept until the with block ends"""
     query = """SELECT transactions.id, timestamp, txid, note, quantity, fee,
                 site.id, site.name, sitetype.id, sitetype.name,
                 transactiontype.id, transactiontype.type, transactiontype.subtype, 
@@ -163,8 +208,8 @@ def get_db_transactions(db: Db, profileid: int) -> list:
             LEFT JOIN asset AS assetfee ON assetfee.id = transactions.fee_asset_id
             WHERE transactions.profile_id=?;"""
     queryargs = (profileid,)
-    result = db.query(query, queryargs)
-    return result
+    with db.query_iter(query, queryargs) as rows:
+        yield rows
 
 
 def update_transaction_child_to_wallet(
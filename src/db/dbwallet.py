@@ -1,19 +1,18 @@
 """
 @author: Arno
 @created: 2023-05-30
-@modified: 2023-10-21
+@modified: 2026-10-17
 
 Database Handler Class
 
 """
 import logging
-
-from netaddr import P
-from numpy import add
+from typing import Iterable
 
 from src.data.dbschemadata import Wallet
-from src.data.dbschematypes import WalletAddressType
 from src.db.db import Db
+from src.db.dbaddresscache import get_address_cache
+from src.db.dbrefcache import get_ref_cache
 from src.errors.dberrors import DbError
 
 log = logging.getLogger(__name__)
@@ -64,6 +63,8 @@ def insert_wallet_raw(
     )
     db.execute(query, queryargs)
     db.commit()
+    get_address_cache(db).invalidate_addresses([address])
+    get_ref_cache(db).invalidate_wallet_unknowns()
 
 
 def check_wallet_exists(db: Db, wallet: Wallet) -> bool:
@@ -115,14 +116,28 @@ def get_one_wallet_id(db: Db, address: str, siteid: int, profileid: int) -> int:
     return result[0][0]
 
 
+def get_wallet_ids_addresses(
+    db: Db, addresses: Iterable[str], siteid: int, profileid: int
+) -> dict[str, list[int]]:
+    """Get wallet ids from db for many addresses of a site and profile at once
+
+    Returns for every found address the list of wallet ids
+    """
+    query = """SELECT address, id FROM wallet 
+            WHERE profile_id=? AND site_id=? AND address IN ({in});"""
+    result: dict[str, list[int]] = {}
+    for address, id in db.query_in(query, set(addresses), (profileid, siteid)):
+        result.setdefault(address, []).append(id)
+    return result
+
+
 def get_wallet_id_unknowns(db: Db, siteid: int, profileid: int) -> int:
-    query = "SELECT id FROM wallet WHERE owned=false AND addresstype=? AND site_id=? AND profile_id=?;"
-    queryargs = (WalletAddressType.UNKNOWN.value, siteid, profileid)
-    result = db.query(query, queryargs)
+    """Get id of the unknowns wallet, from the reference cache"""
+    result = get_ref_cache(db).get_wallet_unknowns_ids(db, siteid, profileid)
     if len(result) == 0:
         return 0
     if len(result) == 1:
-        return result[0][0]
+        return result[0]
     raise DbError(
         f"Multiple records found for the UNKNOWN wallet in database "
         f"for site {siteid} and profile {profileid}: {result}"
@@ -139,24 +154,19 @@ def get_wallet(db: Db, id: int) -> tuple:
     return result[0]
 
 
-def get_db_wallets(db: Db, profileid: int) -> list:
+def get_db_wallets(db: Db, profileid: int) -> list[tuple]:
+    """Get all wallets of a profile"""
     query = """SELECT id, site_id, profile_id, name, address, addresstype, owned, enabled, haschild 
             FROM wallet WHERE profile_id=?;"""
     queryargs = (profileid,)
-    result = db.query(query, queryargs)
-    if len(result) == 0:
-        log.info(f"No records found of a wallet in database")
-    return result
+    return db.query(query, queryargs)
 
 
-def get_all_active_wallets(db: Db) -> list:
+def get_all_active_wallets(db: Db) -> list[tuple]:
+    """Get all active wallets"""
     query = """SELECT id, site_id, profile_id, name, address, addresstype, owned, enabled, haschild 
             FROM wallet WHERE enabled=true AND owned=true"""
-    result = db.query(query)
-    log.debug(f"Record of wallets in database: {result}")
-    if len(result) == 0:
-        log.info(f"No records found of a wallet in database")
-    return result
+    return db.query(query)
 
 
 def update_wallet(db: Db, wallet: Wallet) -> None:
@@ -164,3 +174,5 @@ def update_wallet(db: Db, wallet: Wallet) -> None:
     queryargs = (wallet.name, wallet.address, wallet.enabled, wallet.id)
     db.execute(query, queryargs)
     db.commit()
+    get_address_cache(db).invalidate_wallet(wallet.id)
+    get_ref_cache(db).invalidate_wallet_unknowns()
@@ -1,16 +1,19 @@
 """
 @author: Arno
 @created: 2023-07-04
-@modified: 2023-10-25
+@modified: 2026-10-17
 
 Database Handler Class
 
 """
 import logging
+from typing import Iterable
 
 from src.data.dbschemadata import WalletChild
 from src.data.dbschematypes import ChildAddressType
 from src.db.db import Db
+from src.db.dbaddresscache import get_address_cache
+from src.db.dbwalletderivation import advance_derivation_index_raw
 from src.errors.dberrors import DbError
 
 log = logging.getLogger(__name__)
@@ -22,21 +25,24 @@ def insert_walletchild(db: Db, walletchild: WalletChild) -> None:
         raise DbError(
             f"Not allowed to create new child wallet with same address {walletchild}"
         )
-    insert_walletchild_raw(
-        db=db,
-        parentid=walletchild.parent.id,
-        address=walletchild.address,
-        type=walletchild.type.value,
-        used=walletchild.used,
-    )
+    with db.transaction():
+        insert_walletchild_raw(
+            db=db,
+            parentid=walletchild.parent.id,
+            address=walletchild.address,
+            type=walletchild.type.value,
+            used=walletchild.used,
+        )
+        _advance_derivation_index(db, walletchild, 1)
 
 
 def insert_walletchild_raw(
     db: Db, parentid: int, address: str, type: int = 0, used: bool = True
 ):
-    query = """INSERT OR IGNORE INTO walletchild 
+    query = """INSERT INTO walletchild 
                 (parent_id, address, type, used) 
-            VALUES (?,?,?,?);"""
+            VALUES (?,?,?,?)
+            ON CONFLICT (parent_id, address) DO NOTHING;"""
     queryargs = (
         parentid,
         address,
@@ -45,6 +51,47 @@ def insert_walletchild_raw(
     )
     db.execute(query, queryargs)
     db.commit()
+    get_address_cache(db).invalidate_addresses([address])
+
+
+def upsert_walletchild_raw(
+    db: Db, parentid: int, address: str, type: int = 0, used: bool = True
+) -> int:
+    """Insert child wallet if not exists for this parent
+
+    Returns the id of the new or existing child wallet
+    """
+    query = """INSERT INTO walletchild 
+                (parent_id, address, type, used) 
+            VALUES (?,?,?,?)
+            ON CONFLICT (parent_id, address) DO UPDATE SET used=excluded.used
+            RETURNING id;"""
+    queryargs = (
+        parentid,
+        address,
+        type,
+        used,
+    )
+    result = db.execute_returning(query, queryargs)
+    db.commit()
+    get_address_cache(db).invalidate_addresses([address])
+    return result[0][0]
+
+
+def insert_walletchildren_bulk(db: Db, rows: Iterable[tuple]) -> int:
+    """Insert many child wallets at once
+
+    rows = iterable of tuples (parentid, address, type, used)
+    """
+    query = """INSERT INTO walletchild 
+                (parent_id, address, type, used) 
+            VALUES (?,?,?,?)
+            ON CONFLICT (parent_id, address) DO NOTHING;"""
+    rows = list(rows)
+    result = db.executemany(query, rows)
+    db.commit()
+    get_address_cache(db).invalidate_addresses(row[1] for row in rows)
+    return result
 
 
 def check_walletchild_exists(db: Db, address: str) -> bool:
@@ -80,22 +127,18 @@ def get_walletchild(db: Db, id: int):
     return result
 
 
-def get_walletchilds(db: Db, parentid: int) -> list:
+def get_walletchilds(db: Db, parentid: int) -> list[tuple]:
+    """Get all child wallets of a wallet"""
     query = (
         "SELECT id, parent_id, address, type, used FROM walletchild WHERE parent_id=?;"
     )
-    result = db.query(query, (parentid,))
-    log.debug(f"Record of wallet child in database: {result}")
-    if len(result) == 0:
-        log.info(f"No records found of a wallet child in database")
-    return result
+    return db.query(query, (parentid,))
 
 
 def get_walletchild_addresses(db: Db, parentid: int) -> list[str]:
-    result = get_walletchilds(db, parentid)
-    addresses: list[str] = []
-    for res in result:
-        addresses.append(res[2])
+    addresses = [res[2] for res in get_walletchilds(db, parentid)]
+    if len(addresses) == 0:
+        log.info(f"No records found of a wallet child in database")
     return addresses
 
 
@@ -113,6 +156,17 @@ def get_nr_walletchildtypes(db: Db, parentid: int, type: ChildAddressType) -> in
     return len(result)
 
 
+def _advance_derivation_index(db: Db, walletchild: WalletChild, nr: int) -> None:
+    """Receiving and change child addresses move the derivation cursor of the parent"""
+    if nr > 0 and walletchild.type in (
+        ChildAddressType.RECEIVING,
+        ChildAddressType.CHANGE,
+    ):
+        advance_derivation_index_raw(
+            db, walletchild.parent.id, walletchild.type.value, nr
+        )
+
+
 def update_child_of_wallet_unkowns(
     db: Db, unknwonparentid: int, walletchild: WalletChild
 ):
@@ -126,8 +180,12 @@ def update_child_of_wallet_unkowns(
         unknwonparentid,
         walletchild.address,
     )
-    db.execute(query, queryargs)
-    db.commit()
+    with db.transaction():
+        db.execute(query, queryargs)
+        # Only a moved child wallet moves the cursor, the transaction reads on the writer
+        nr_updated = db.query("SELECT changes();")[0][0]
+        _advance_derivation_index(db, walletchild, nr_updated)
+    get_address_cache(db).invalidate_addresses([walletchild.address])
 
 
 def delete_walletchild_id(db: Db, id: int) -> None:
@@ -136,3 +194,4 @@ def delete_walletchild_id(db: Db, id: int) -> None:
     queryargs = (id,)
     db.execute(query, queryargs)
     db.commit()
+    get_address_cache(db).invalidate_walletchild(id)
@@ -0,0 +1,37 @@
+"""
+@author: Arno
+@created: 2026-10-17
+@modified: 2026-10-17
+
+Database Handler Class
+
+"""
+import logging
+
+from src.data.dbschematypes import ChildAddressType
+from src.db.db import Db
+
+log = logging.getLogger(__name__)
+
+
+def get_derivation_index(db: Db, walletid: int, type: ChildAddressType) -> int:
+    """First index of the chain of a wallet that is not yet a child address"""
+    query = "SELECT next_index FROM walletderivation WHERE wallet_id=? AND type=?;"
+    queryargs = (walletid, type.value)
+    result = db.query(query, queryargs)
+    if len(result) == 0:
+        return 0
+    return result[0][0]
+
+
+def advance_derivation_index_raw(
+    db: Db, walletid: int, type: int, nr_indexes: int = 1
+) -> None:
+    """Move the derivation cursor of the chain of a wallet with nr of indexes"""
+    query = """INSERT INTO walletderivation (wallet_id, type, next_index) 
+            VALUES (?,?,?)
+            ON CONFLICT (wallet_id, type) DO UPDATE SET 
+                next_index=next_index + excluded.next_index;"""
+    queryargs = (walletid, type, nr_indexes)
+    db.execute(query, queryargs)
+    db.commit()
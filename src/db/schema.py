@@ -1,7 +1,7 @@
 """
 @author: Arno
 @created: 2023-05-15
-@modified: 2023-08-09
+@modified: 2026-10-17
 
 Database Schema to create tables
 
@@ -17,9 +17,6 @@ CREATE TABLE IF NOT EXISTS version (
     status INTEGER
 );
 """
-DB_INSERT_VERSION_1 = f"""
-INSERT OR IGNORE INTO version VALUES (1, '1 - Initial', strftime('%s', '2023-05-15'), strftime('%s', 'now'), NULL, 0);
-"""
 
 DB_CREATE_PROFILE = f"""
 CREATE TABLE IF NOT EXISTS profile (
@@ -191,25 +188,189 @@ CREATE TABLE IF NOT EXISTS pricehist (
 """
 
 
-DB_SCRIPT_CREATE_TABLES = f"""
-PRAGMA foreign_keys=off;
-BEGIN TRANSACTION;
-{DB_CREATE_VERSION}
-{DB_INSERT_VERSION_1}
-{DB_CREATE_PROFILE}
-{DB_CREATE_SITE_TYPE}
-{DB_CREATE_SITE}
-{DB_CREATE_ASSET}
-{DB_CREATE_ASSET_ON_SITE}
-{DB_CREATE_SCRAPING_PRICE}
-{DB_CREATE_SCRAPING_TXN}
-{DB_CREATE_WALLETADDRESS_TYPE}
-{DB_CREATE_WALLET}
-{DB_CREATE_CHILDADDRESS_TYPE}
-{DB_CREATE_WALLET_CHILD}
-{DB_CREATE_TRANSACTION_TYPE}
-{DB_CREATE_TRANSACTION}
-{DB_CREATE_PRICE_HIST}
-COMMIT;
-PRAGMA foreign_keys=on;
+# Migrations, every list is applied in one transaction by the migration runner
+# Version 1: initial tables
+DB_MIGRATION_1 = [
+    DB_CREATE_VERSION,
+    DB_CREATE_PROFILE,
+    DB_CREATE_SITE_TYPE,
+    DB_CREATE_SITE,
+    DB_CREATE_ASSET,
+    DB_CREATE_ASSET_ON_SITE,
+    DB_CREATE_SCRAPING_PRICE,
+    DB_CREATE_SCRAPING_TXN,
+    DB_CREATE_WALLETADDRESS_TYPE,
+    DB_CREATE_WALLET,
+    DB_CREATE_CHILDADDRESS_TYPE,
+    DB_CREATE_WALLET_CHILD,
+    DB_CREATE_TRANSACTION_TYPE,
+    DB_CREATE_TRANSACTION,
+    DB_CREATE_PRICE_HIST,
+]
+
+
+# Version 2: indexes for the lookups done for every ingested transaction
+# get_wallet_id_raw / get_one_wallet_id
+DB_CREATE_INDEX_WALLET_ADDRESS = f"""
+CREATE INDEX IF NOT EXISTS idx_wallet_profile_site_address ON wallet (profile_id, site_id, address);
+"""
+
+# get_wallet_id_unknowns
+DB_CREATE_INDEX_WALLET_TYPE = f"""
+CREATE INDEX IF NOT EXISTS idx_wallet_site_profile_type ON wallet (site_id, profile_id, addresstype, owned);
+"""
+
+# get_walletchild_ids_join
+DB_CREATE_INDEX_WALLETCHILD_ADDRESS = f"""
+CREATE INDEX IF NOT EXISTS idx_walletchild_address ON walletchild (address, parent_id, used);
+"""
+
+# check_transaction_exists
+DB_CREATE_INDEX_TRANSACTION_TXID = f"""
+CREATE INDEX IF NOT EXISTS idx_transactions_txid ON transactions (txid, to_wallet_id, to_walletchild_id);
+"""
+
+# get_asset_ids, name or symbol on chain
+DB_CREATE_INDEX_ASSET = f"""
+CREATE INDEX IF NOT EXISTS idx_asset_symbol_chain ON asset (symbol, chain);
+CREATE INDEX IF NOT EXISTS idx_asset_name_chain ON asset (name, chain);
+"""
+
+# get_scrapingtxn_ids
+DB_CREATE_INDEX_SCRAPINGTXN = f"""
+CREATE INDEX IF NOT EXISTS idx_scrapingtxn_wallet ON scrapingtxn (wallet_id, scrape_timestamp_start, scrape_timestamp_end);
+"""
+
+DB_MIGRATION_2 = [
+    DB_CREATE_INDEX_WALLET_ADDRESS,
+    DB_CREATE_INDEX_WALLET_TYPE,
+    DB_CREATE_INDEX_WALLETCHILD_ADDRESS,
+    DB_CREATE_INDEX_TRANSACTION_TXID,
+    DB_CREATE_INDEX_ASSET,
+    DB_CREATE_INDEX_SCRAPINGTXN,
+]
+
+
+# Version 3: unique constraints on the natural keys, for upserts during ingest
+# Child addresses are unique per parent wallet
+# Duplicates are removed first, transactions are moved to the remaining child
+DB_CREATE_UNIQUE_WALLETCHILD = f"""
+UPDATE transactions SET from_walletchild_id = (
+    SELECT MIN(w2.id) FROM walletchild AS w1 
+    INNER JOIN walletchild AS w2 ON w2.parent_id = w1.parent_id AND w2.address = w1.address 
+    WHERE w1.id = transactions.from_walletchild_id) 
+WHERE from_walletchild_id IS NOT NULL;
+UPDATE transactions SET to_walletchild_id = (
+    SELECT MIN(w2.id) FROM walletchild AS w1 
+    INNER JOIN walletchild AS w2 ON w2.parent_id = w1.parent_id AND w2.address = w1.address 
+    WHERE w1.id = transactions.to_walletchild_id) 
+WHERE to_walletchild_id IS NOT NULL;
+DELETE FROM walletchild WHERE id NOT IN (
+    SELECT MIN(id) FROM walletchild GROUP BY parent_id, address);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_walletchild_parent_address ON walletchild (parent_id, address);
+"""
+
+# A transaction is unique for txid and from/to (child) wallet
+# No child wallet is stored as NULL, which is never equal in an unique index
+DB_CREATE_UNIQUE_TRANSACTION = f"""
+DELETE FROM transactions WHERE id NOT IN (
+    SELECT MIN(id) FROM transactions 
+    GROUP BY txid, from_wallet_id, IFNULL(from_walletchild_id, 0), to_wallet_id, IFNULL(to_walletchild_id, 0));
+DROP INDEX IF EXISTS idx_transactions_txid;
+CREATE UNIQUE INDEX IF NOT EXISTS uq_transactions_txid_from_to ON transactions 
+    (txid, from_wallet_id, IFNULL(from_walletchild_id, 0), to_wallet_id, IFNULL(to_walletchild_id, 0));
+"""
+
+# One scraping record per wallet
+DB_CREATE_UNIQUE_SCRAPINGTXN = f"""
+DELETE FROM scrapingtxn WHERE id NOT IN (
+    SELECT MIN(id) FROM scrapingtxn GROUP BY wallet_id);
+DROP INDEX IF EXISTS idx_scrapingtxn_wallet;
+CREATE UNIQUE INDEX IF NOT EXISTS uq_scrapingtxn_wallet ON scrapingtxn (wallet_id);
+"""
+
+DB_MIGRATION_3 = [
+    DB_CREATE_UNIQUE_WALLETCHILD,
+    DB_CREATE_UNIQUE_TRANSACTION,
+    DB_CREATE_UNIQUE_SCRAPINGTXN,
+]
+
+
+# Version 4: indexes found by the query plan check (src/db/dbqueryplan.py)
+# get_db_transactions
+DB_CREATE_INDEX_TRANSACTION_PROFILE = f"""
+CREATE INDEX IF NOT EXISTS idx_transactions_profile ON transactions (profile_id);
+"""
+
+# update_transaction_child_to_wallet, only rows with a child wallet
+DB_CREATE_INDEX_TRANSACTION_CHILD = f"""
+CREATE INDEX IF NOT EXISTS idx_transactions_from_walletchild ON transactions (from_walletchild_id) 
+    WHERE from_walletchild_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_transactions_to_walletchild ON transactions (to_walletchild_id) 
+    WHERE to_walletchild_id IS NOT NULL;
+"""
+
+DB_MIGRATION_4 = [
+    DB_CREATE_INDEX_TRANSACTION_PROFILE,
+    DB_CREATE_INDEX_TRANSACTION_CHILD,
+]
+
+
+# Version 5: scraping time per address of a wallet, for wallets with child addresses
+# every child address has its own last time, last txid and nr of txns
+DB_CREATE_SCRAPING_ADDRESS = f"""
+CREATE TABLE IF NOT EXISTS scrapingaddress (
+    id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+    wallet_id INTEGER NOT NULL,
+    address TEXT NOT NULL,
+    scrape_timestamp_end INTEGER NOT NULL,
+    last_txid TEXT NOT NULL DEFAULT '',
+    n_tx INTEGER NOT NULL DEFAULT 0,
+    CONSTRAINT FK_scrapingaddress_wallet FOREIGN KEY (wallet_id) REFERENCES wallet(id) ON UPDATE CASCADE ON DELETE CASCADE
+);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_scrapingaddress_wallet_address ON scrapingaddress (wallet_id, address);
+"""
+
+# Start with the last time of the wallet for all existing addresses
+DB_INSERT_SCRAPING_ADDRESS = f"""
+INSERT OR IGNORE INTO scrapingaddress (wallet_id, address, scrape_timestamp_end) 
+    SELECT scrapingtxn.wallet_id, wallet.address, scrapingtxn.scrape_timestamp_end FROM scrapingtxn 
+    INNER JOIN wallet ON wallet.id = scrapingtxn.wallet_id 
+    WHERE wallet.haschild = false;
+INSERT OR IGNORE INTO scrapingaddress (wallet_id, address, scrape_timestamp_end) 
+    SELECT scrapingtxn.wallet_id, walletchild.address, scrapingtxn.scrape_timestamp_end FROM scrapingtxn 
+    INNER JOIN walletchild ON walletchild.parent_id = scrapingtxn.wallet_id;
+"""
+
+DB_MIGRATION_5 = [
+    DB_CREATE_SCRAPING_ADDRESS,
+    DB_INSERT_SCRAPING_ADDRESS,
+]
+
+
+# Version 6: derivation cursor per wallet with child addresses and per child address type
+# next_index is the first index of the chain that is not yet a child address
+DB_CREATE_WALLET_DERIVATION = f"""
+CREATE TABLE IF NOT EXISTS walletderivation (
+    id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+    wallet_id INTEGER NOT NULL,
+    type INTEGER NOT NULL,
+    next_index INTEGER NOT NULL DEFAULT 0,
+    CONSTRAINT FK_walletderivation_wallet FOREIGN KEY (wallet_id) REFERENCES wallet(id) ON UPDATE CASCADE ON DELETE CASCADE,
+    CONSTRAINT FK_walletderivation_type FOREIGN KEY (type) REFERENCES childaddresstype(id) ON UPDATE CASCADE ON DELETE CASCADE
+);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_walletderivation_wallet_type ON walletderivation (wallet_id, type);
+"""
+
+# Start with the nr of existing receiving (1) and change (2) child addresses
+DB_INSERT_WALLET_DERIVATION = f"""
+INSERT OR IGNORE INTO walletderivation (wallet_id, type, next_index) 
+    SELECT parent_id, type, COUNT(*) FROM walletchild 
+    WHERE type IN (1, 2) 
+    GROUP BY parent_id, type;
 """
+
+DB_MIGRATION_6 = [
+    DB_CREATE_WALLET_DERIVATION,
+    DB_INSERT_WALLET_DERIVATION,
+]
@@ -1,7 +1,7 @@
 """
 @author: Arno
 @created: 2023-08-09
-@modified: 2023-08-18
+@modified: 2026-10-17
 
 Custom errors for Models
 """
@@ -17,3 +17,7 @@ class WalletIdError(Exception):
 
 class ChildAddressTypeError(Exception):
     """Thrown when a child address type not valid"""
+
+
+class ChainProviderError(Exception):
+    """Thrown when a chain data provider is not known"""
@@ -1,7 +1,7 @@
 """
 @author: Arno
 @created: 2023-05-26
-@modified: 2023-10-23
+@modified: 2026-10-17
 
 Abstract class for all sites
 
@@ -11,16 +11,24 @@ The settings can be changed by user in Database, but must be initialized
 """
 import logging
 from abc import ABC, abstractmethod
+from dataclasses import replace
+from typing import Any, AsyncIterator, Callable, Iterator
 
-from src.data.dbschemadata import Price, Site, TransactionRaw, Wallet, WalletChild
+import config
+from src.data.dbschemadata import (
+    Price,
+    Site,
+    TransactionPage,
+    TransactionRaw,
+    Wallet,
+    WalletChild,
+)
 from src.data.dbschematypes import WalletAddressType
 from src.data.types import Timestamp, TransactionInfo
 from src.db.db import Db
-from src.db.dbscrapingtxn import (
-    get_scrapingtxn_timestamp_end,
-    insert_ignore_scrapingtxn_raw,
-    update_scrapingtxn_raw,
-)
+from src.db.dbaddresscache import get_address_cache
+from src.db.dbscrapingaddress import get_scrapingaddresses, upsert_scrapingaddress_raw
+from src.db.dbscrapingtxn import insert_ignore_scrapingtxn_raw, update_scrapingtxn_raw
 from src.db.dbsitemodel import get_sitemodel, insert_sitemodel, update_sitemodel
 from src.db.dbwallet import get_wallet_id, get_wallet_id_unknowns
 from src.db.dbwalletchild import (
@@ -29,15 +37,103 @@ from src.db.dbwalletchild import (
     update_child_of_wallet_unkowns,
 )
 from src.errors.modelerrors import WalletIdError
-from src.srv.serverhelper2 import process_and_insert_rawtransaction
+from src.srv.dbwriter import DbWriter
+from src.srv.fetchengine import FetchEngine
+from src.srv.serverhelper2 import process_and_insert_rawtransactions
 
 log = logging.getLogger(__name__)
 
 
+def plan_address_groups(
+    addresses: list[str],
+    scraped: dict[str, tuple[int, str, int]],
+    batch_size: int = 1,
+) -> list[tuple[Timestamp, list[str]]]:
+    """Groups of batch_size addresses with a near last scraping time
+
+    The addresses are sorted by their last time, a group is read from the
+    oldest last time of its addresses. The txns of an address at or before its
+    own last time are dropped by AddressProgress.new_page, existing txns are
+    skipped at insert anyway.
+    New addresses without a last time get their full history
+    Returns a list of (last time, addresses)"""
+    batch_size = max(batch_size, 1)
+    ordered = sorted(addresses, key=lambda address: scraped.get(address, (0,))[0])
+    groups: list[tuple[Timestamp, list[str]]] = []
+    for i in range(0, len(ordered), batch_size):
+        group = ordered[i : i + batch_size]
+        groups.append((Timestamp(scraped.get(group[0], (0,))[0]), group))
+    return groups
+
+
+def call_direct(fn: Callable[..., Any], *args: Any) -> Any:
+    """Call a database function on this thread, without a database writer"""
+    return fn(*args)
+
+
+class AddressProgress:
+    """Newest transaction per address during a search
+
+    scraped = per address (scrape_timestamp_end, last_txid, n_tx) of last time
+    The scrape_timestamp_end of an address is its newest timestamp + 1
+    """
+
+    def __init__(
+        self, addresses: list[str], scraped: dict[str, tuple[int, str, int]]
+    ) -> None:
+        self.newest: dict[str, tuple[int, str, int]] = {
+            address: scraped.get(address, (0, "", 0)) for address in addresses
+        }
+        # Last time per address at the start of the search
+        self.last_time: dict[str, int] = {
+            address: newest[0] for address, newest in self.newest.items()
+        }
+        self.finished: set[str] = set()
+
+    def new_page(self, page: TransactionPage) -> TransactionPage:
+        """The page without the txns that are at or before the last time of
+        their address, a group is read from the oldest last time of the group"""
+        transactions = [txn for txn in page.transactions if self._is_new(txn)]
+        if len(transactions) == len(page.transactions):
+            return page
+        return replace(page, transactions=transactions)
+
+    def _is_new(self, txn: TransactionRaw) -> bool:
+        last_times = [
+            self.last_time[address]
+            for address in (txn.from_wallet, txn.to_wallet)
+            if address in self.last_time
+        ]
+        return len(last_times) == 0 or txn.timestamp > min(last_times)
+
+    def add_page(self, page: TransactionPage) -> list[str]:
+        """Returns the addresses of which this was the last page"""
+        for txn in page.transactions:
+            for address in (txn.from_wallet, txn.to_wallet):
+                newest = self.newest.get(address)
+                if newest != None and txn.timestamp + 1 > newest[0]:
+                    self.newest[address] = (txn.timestamp + 1, txn.txid, newest[2])
+        addresses = [address for address in page.n_tx if address in self.newest]
+        for address in addresses:
+            end, txid, _ = self.newest[address]
+            self.newest[address] = (end, txid, page.n_tx[address])
+        if not page.last:
+            return []
+        self.finished.update(addresses)
+        return addresses
+
+    def unfinished(self) -> list[str]:
+        return [address for address in self.newest if address not in self.finished]
+
+
 class SiteModel(ABC):
     def __init__(self) -> None:
         super().__init__()
         self.site: Site
+        # Host of the api, requests to the same host share their limits
+        self.api_host: str = ""
+        # Nr of addresses of which the txns are read at once
+        self.history_batch_size: int = 1
 
     def model_dbinit(self, db: Db) -> None:
         """Initialization of site model in database
@@ -62,7 +158,49 @@ class SiteModel(ABC):
         self.site.secret = secret
         update_sitemodel(db, self.site)
 
-    def search_transactions(self, db: Db, wallet: Wallet) -> None:
+    def search_transactions(
+        self, db: Db, wallet: Wallet, writer: DbWriter | None = None
+    ) -> None:
+        """Search and insert new transactions of the wallet
+        writer = database writer for all writes, when searching in a worker thread
+        """
+        if not self.is_searchable(wallet):
+            return
+        write = call_direct if writer == None else writer.call
+        if wallet.haschild:
+            childwallets = self.find_new_childwallets(db, wallet)
+            write(self.insert_new_childwallets, db, wallet, childwallets)
+        self._search_transactions(db, wallet, write)
+
+    async def search_transactions_async(
+        self, engine: FetchEngine, db: Db, wallet: Wallet
+    ) -> None:
+        """Like search_transactions, the requests are done by the fetch engine
+        and all database writes are handed to its database writer"""
+        if not self.is_searchable(wallet):
+            return
+        if wallet.haschild:
+            childwallets = await engine.fetch(
+                self.api_host, self.find_new_childwallets, db, wallet
+            )
+            await engine.write(self.insert_new_childwallets, db, wallet, childwallets)
+        addresses, scraped = await engine.write(self.prepare_search, db, wallet)
+        addresses = await engine.fetch(
+            self.api_host, self.get_changed_addresses, addresses, scraped
+        )
+        nr_txns = 0
+        groups = plan_address_groups(addresses, scraped, self.history_batch_size)
+        for last_time, group in groups:
+            progress = AddressProgress(group, scraped)
+            async for page in self.iter_transactions_async(engine, group, last_time):
+                page = progress.new_page(page)
+                nr_txns += len(page.transactions)
+                await engine.write(self.store_page, db, wallet, page, progress)
+            await engine.write(self.store_progress, db, wallet, progress)
+        log.debug(f"New found transactions: {nr_txns}")
+        await engine.write(self.finish_search, db, wallet)
+
+    def is_searchable(self, wallet: Wallet) -> bool:
         log.debug(f"Check for new transactions {self.site.name}-{wallet.address}")
         if (
             wallet.addresstype == WalletAddressType.INVALID
@@ -71,12 +209,29 @@ class SiteModel(ABC):
             logging.exception(
                 f"Not searching transactions for {wallet.addresstype} wallet: {self.site.name}-{wallet.address}"
             )
-            return
-        if wallet.haschild:
-            self.check_for_new_childwallets(db, wallet)
-        self._search_transactions(db, wallet)
+            return False
+        return True
+
+    def _search_transactions(
+        self, db: Db, wallet: Wallet, write: Callable[..., Any] = call_direct
+    ) -> None:
+        addresses, scraped = write(self.prepare_search, db, wallet)
+        addresses = self.get_changed_addresses(addresses, scraped)
+        nr_txns = 0
+        groups = plan_address_groups(addresses, scraped, self.history_batch_size)
+        for last_time, group in groups:
+            nr_txns += self.search_address_group(
+                db, wallet, group, last_time, scraped, write
+            )
+        log.debug(f"New found transactions: {nr_txns}")
+        write(self.finish_search, db, wallet)
+        return
 
-    def _search_transactions(self, db: Db, wallet: Wallet) -> None:
+    def prepare_search(
+        self, db: Db, wallet: Wallet
+    ) -> tuple[list[str], dict[str, tuple[int, str, int]]]:
+        """Addresses of the wallet and per address the scraping state
+        (scrape_timestamp_end, last_txid, n_tx) of the previous search"""
         log.debug(f"Start searching transactions for {self.site.name}-{wallet.address}")
         if wallet.haschild:
             addresses = get_walletchild_addresses(db, wallet.id)
@@ -84,46 +239,146 @@ class SiteModel(ABC):
             addresses = [wallet.address]
 
         insert_ignore_scrapingtxn_raw(db, wallet.id)
-        last_time = get_scrapingtxn_timestamp_end(db, wallet)
-        txns: list[TransactionRaw] = self.get_transactions(addresses, last_time)
-        txns.sort()
-        log.debug(f"New found transactions: {len(txns)}")
-        for txn in txns:
-            result_ok = process_and_insert_rawtransaction(
-                db, txn, wallet.profile.id, self.site
+        scraped = get_scrapingaddresses(db, wallet.id)
+        get_address_cache(db).warm(db, self.site.id, wallet.profile.id)
+        return addresses, scraped
+
+    def finish_search(self, db: Db, wallet: Wallet) -> None:
+        """Last scraping time of the wallet is the newest of its addresses"""
+        scraped = get_scrapingaddresses(db, wallet.id)
+        last_timestamp = max((end for end, _, _ in scraped.values()), default=0)
+        if last_timestamp > 0:
+            update_scrapingtxn_raw(db, last_timestamp, wallet.id)
+
+    def get_changed_addresses(
+        self, addresses: list[str], scraped: dict[str, tuple[int, str, int]]
+    ) -> list[str]:
+        """Only addresses with a different nr of txns than last time
+
+        The nr of txns of all addresses is read in batches with
+        get_transaction_info, which is much cheaper than reading the txns.
+        For changed addresses the new nr of txns is put in scraped, it is
+        stored after the txns of the address are read.
+        When the site has no transaction info, all addresses are returned
+        """
+        changed: list[str] = []
+        batch_size = config.TRANSACTION_INFO_BATCH_SIZE
+        for i in range(0, len(addresses), batch_size):
+            try:
+                txs_info = self.get_transaction_info(addresses[i : i + batch_size])
+            except NotImplementedError:
+                return addresses
+            for txinfo in txs_info:
+                end, txid, n_tx = scraped.get(txinfo.address, (0, "", 0))
+                if txinfo.nr_txs != n_tx:
+                    changed.append(txinfo.address)
+                    scraped[txinfo.address] = (end, txid, txinfo.nr_txs)
+        log.debug(
+            f"Addresses with new transactions: {len(changed)} of {len(addresses)}"
+        )
+        return changed
+
+    def search_address_group(
+        self,
+        db: Db,
+        wallet: Wallet,
+        addresses: list[str],
+        last_time: Timestamp,
+        scraped: dict[str, tuple[int, str, int]],
+        write: Callable[..., Any] = call_direct,
+    ) -> int:
+        """Search and insert transactions of addresses with a near last time
+        last_time = oldest last time of the addresses
+
+        Pages are inserted as they come, the order of the pages is not important,
+        existing transactions are skipped. The last time of an address is
+        updated after its last page, so an interrupted search starts again
+        from the previous last time of the unfinished addresses
+        scraped = per address (scrape_timestamp_end, last_txid, n_tx)
+        write = calls the database functions, directly or by the database writer
+        Returns the nr of found transactions
+        """
+        progress = AddressProgress(addresses, scraped)
+        nr_txns = 0
+        for page in self.iter_transactions(addresses, last_time):
+            page = progress.new_page(page)
+            nr_txns += len(page.transactions)
+            write(self.store_page, db, wallet, page, progress)
+        write(self.store_progress, db, wallet, progress)
+        return nr_txns
+
+    def store_page(
+        self, db: Db, wallet: Wallet, page: TransactionPage, progress: AddressProgress
+    ) -> None:
+        """Insert a page, after the last page of an address its last time is stored
+        The page and the last times are committed at once"""
+        with db.transaction():
+            self.insert_transaction_page(db, wallet, page)
+            for address in progress.add_page(page):
+                upsert_scrapingaddress_raw(
+                    db, wallet.id, address, *progress.newest[address]
+                )
+
+    def store_progress(self, db: Db, wallet: Wallet, progress: AddressProgress) -> None:
+        """Store the last time of the addresses without a last page"""
+        for address in progress.unfinished():
+            upsert_scrapingaddress_raw(
+                db, wallet.id, address, *progress.newest[address]
             )
-            if result_ok:
-                update_scrapingtxn_raw(db, txn.timestamp + 1, wallet.id)
-        return
+
+    def insert_transaction_page(
+        self, db: Db, wallet: Wallet, page: TransactionPage
+    ) -> int:
+        """Insert the transactions of one page, committed per batch
+        Returns the newest timestamp of the transactions or 0"""
+        txns = page.transactions
+        batch_size = config.DB_COMMIT_BATCH_SIZE
+        for i in range(0, len(txns), batch_size):
+            batch = txns[i : i + batch_size]
+            with db.transaction():
+                results = process_and_insert_rawtransactions(
+                    db, batch, wallet.profile.id, self.site
+                )
+            log.debug(f"Inserted {sum(results)} of {len(batch)} transactions")
+        return max((txn.timestamp for txn in txns), default=0)
 
     def check_for_new_childwallets(self, db: Db, wallet: Wallet):
+        childwallets = self.find_new_childwallets(db, wallet)
+        self.insert_new_childwallets(db, wallet, childwallets)
+
+    def find_new_childwallets(self, db: Db, wallet: Wallet) -> list[WalletChild]:
         log.debug(f"Check for new child wallets {self.site.name}-{wallet.address}")
         if wallet.id == 0:
             raise WalletIdError(f"No id in structure for wallet: {wallet}")
-        childwallets = self.get_new_child_addresses(db, wallet)
-        for child in childwallets:
-            wallet_uknowns_parent_id = get_wallet_id_unknowns(
-                db, self.site.id, wallet.profile.id
-            )
-            if wallet_uknowns_parent_id > 0:
-                # Change the master of the child to new master wallet
-                update_child_of_wallet_unkowns(db, wallet_uknowns_parent_id, child)
-            else:
-                # Check if child address already defined as a normal wallet address,
-                # then user must first remove that wallet
-                wallet_child_check = wallet
-                wallet_child_check.address = child.address
-                wallet_exists_id = get_wallet_id(db, wallet_child_check)
-                if wallet_exists_id > 0:
-                    log.error(
-                        f"Child address already exists as normal wallet address: {child.address}, "
-                        f"Existing wallet id: {wallet_exists_id} on "
-                        f"{'No site' if wallet.site == None else wallet.site.name} "
-                        f"Please remove this wallet, before new child addresses can be added"
-                    )
-                    break
-
-                insert_walletchild(db, child)
+        return self.get_new_child_addresses(db, wallet)
+
+    def insert_new_childwallets(
+        self, db: Db, wallet: Wallet, childwallets: list[WalletChild]
+    ) -> None:
+        # All child addresses of this wallet are committed at once
+        with db.transaction():
+            for child in childwallets:
+                wallet_uknowns_parent_id = get_wallet_id_unknowns(
+                    db, self.site.id, wallet.profile.id
+                )
+                if wallet_uknowns_parent_id > 0:
+                    # Change the master of the child to new master wallet
+                    update_child_of_wallet_unkowns(db, wallet_uknowns_parent_id, child)
+                else:
+                    # Check if child address already defined as a normal wallet address,
+                    # then user must first remove that wallet
+                    wallet_child_check = replace(wallet, address=child.address)
+                    wallet_exists_id = get_wallet_id(db, wallet_child_check)
+                    if wallet_exists_id > 0:
+                        log.error(
+                            f"Child address already exists as normal wallet address: {child.address}, "
+                            f"Existing wallet id: {wallet_exists_id} on "
+                            f"{'No site' if wallet.site == None else wallet.site.name} "
+                            f"Please remove this wallet, before new child addresses can be added"
+                        )
+                        break
+
+                    insert_walletchild(db, child)
         for child in childwallets:
             log.debug(
                 f"New child address: {child.address} - {child.type} - {child.parent.addresstype} - {child.parent.address:.10}"
@@ -149,6 +404,25 @@ class SiteModel(ABC):
             f"Site model {self.__class__.__name__} doesn't have transactions"
         )
 
+    def iter_transactions(
+        self, addresses: list[str], last_time: Timestamp = Timestamp(0)
+    ) -> Iterator[TransactionPage]:
+        """Pages of transactions, to insert them before all are read
+        Default is one page with the result of get_transactions"""
+        yield TransactionPage(self.get_transactions(addresses, last_time))
+
+    def iter_transactions_async(
+        self,
+        engine: FetchEngine,
+        addresses: list[str],
+        last_time: Timestamp = Timestamp(0),
+    ) -> AsyncIterator[TransactionPage]:
+        """Pages of transactions for the fetch engine, override for an async api
+        Default reads the pages of iter_transactions in the worker threads"""
+        return engine.iter_fetch(
+            self.api_host, self.iter_transactions(addresses, last_time)
+        )
+
     def get_transaction_info(self, addresses: list[str]) -> list[TransactionInfo]:
         raise NotImplementedError(
             f"Site model {self.__class__.__name__} doesn't have transactions"
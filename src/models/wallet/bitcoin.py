@@ -1,33 +1,37 @@
 """
 @author: Arno
 @created: 2023-05-29
-@modified: 2023-10-27
+@modified: 2026-10-17
 
 Sitemodel for bitcoin blockchain
 
 """
 import logging
-import time
+from typing import Iterator
 
 from pycoin.networks.registry import network_for_netcode  # type: ignore
 
 import config
-from src.data.dbschemadata import Asset, Site, TransactionRaw, Wallet, WalletChild
-from src.data.dbschematypes import (
-    ChildAddressType,
-    SiteType,
-    TransactionType,
-    WalletAddressType,
+from src.data.dbschemadata import (
+    Asset,
+    Site,
+    TransactionPage,
+    TransactionRaw,
+    Wallet,
+    WalletChild,
 )
+from src.data.dbschematypes import ChildAddressType, SiteType, WalletAddressType
 from src.data.types import Timestamp, TransactionInfo
 from src.db.db import Db
 from src.db.dbasset import insert_asset
-from src.db.dbwalletchild import get_nr_walletchildtypes
-from src.errors.modelerrors import ChildAddressTypeError, WalletAddressTypeError
-from src.errors.reqerrors import TransactionValueNotFoundError
-from src.func.helperfunc import convert_timestamp
+from src.db.dbwalletderivation import get_derivation_index
+from src.errors.modelerrors import ChainProviderError, WalletAddressTypeError
 from src.models.sitemodel import SiteModel
-from src.req.requesthelper import request_get_dict
+from src.models.wallet.blockchaininfo import BlockchainInfo
+from src.models.wallet.chainprovider import ChainProvider
+from src.models.wallet.derivation import get_key_derivation
+from src.models.wallet.esplora import Esplora
+from src.models.wallet.gaplimit import scan_gap_limit
 
 log = logging.getLogger(__name__)
 
@@ -44,6 +48,9 @@ class Bitcoin(SiteModel):
             hasprice=False,
             enabled=True,
         )
+        self.provider = get_chain_provider(config.BITCOIN_PROVIDER)
+        self.api_host = self.provider.host
+        self.history_batch_size = self.provider.history_batch_size
 
     def asset_dbinit(self, db: Db) -> None:
         """Initialize asset bitcoin, BTC. No AssetOnSite necessary"""
@@ -91,259 +98,71 @@ class Bitcoin(SiteModel):
                 f"Wallet address type must be a master public key type: {wallet}"
             )
 
-        address_receiving = self._get_new_child_addresses(
-            db=db,
-            wallet=wallet,
-            childtype=ChildAddressType.RECEIVING,
+        # Chain of the child addresses in the derivation path
+        chains = {ChildAddressType.RECEIVING: 0, ChildAddressType.CHANGE: 1}
+        # Start at the derivation cursor of the receiving and change addresses in db
+        starts = {
+            chain: get_derivation_index(db, wallet.id, childtype)
+            for childtype, chain in chains.items()
+        }
+        log.debug(f"Start get new child addresses for: {wallet.address} from {starts}")
+        found = scan_gap_limit(
+            derivation=get_key_derivation(wallet.address, wallet.addresstype),
+            starts=starts,
+            get_transaction_info=self.get_transaction_info,
+            gap_limit=config.GAP_LIMIT,
+            batch_size=config.TRANSACTION_INFO_BATCH_SIZE,
+            window_max=config.DERIVATION_WINDOW_MAX,
         )
-        address_change = self._get_new_child_addresses(
-            db=db,
-            wallet=wallet,
-            childtype=ChildAddressType.CHANGE,
-        )
-        return address_receiving + address_change
-
-    def _get_new_child_addresses(
-        self,
-        db: Db,
-        wallet: Wallet,
-        childtype: ChildAddressType,
-    ) -> list[WalletChild]:
-        if childtype != ChildAddressType.RECEIVING:
-            ca_code = 1
-        elif childtype != ChildAddressType.CHANGE:
-            ca_code = 0
-        else:
-            raise ChildAddressTypeError(
-                f"Child address type must be RECEIVING or CHANGE: {wallet} - {childtype}"
-            )
-        # Get amount of existing child addresses in db for receiving or change address
-        batch_start = get_nr_walletchildtypes(db, wallet.id, childtype)
-        batch_size = config.CHILD_ADDRESS_BATCH_SIZE
-        log.debug(f"Start get new child address for: {childtype} - {wallet.address}")
-        log.debug(f"Starting batch from {batch_start}")
-        network = network_for_netcode(
-            "BTC"
-        )  # TODO: bring in general place, is also used above, make bitcoin kind of module
         childwallets: list[WalletChild] = []
-        childzero: list[WalletChild] = []
-        check_new_txs = True
-        while check_new_txs:
-            addresses: list[str] = []
-            if wallet.addresstype == WalletAddressType.ELECTRUM:
-                k = network.parse.electrum_pub("E:" + wallet.address)
-                if k == None:
-                    raise WalletAddressTypeError(
-                        f"Public key is not an electrum mpk: {wallet}"
-                    )
-                for key in k.subkeys(
-                    f"{batch_start}-{batch_start+batch_size}/{ca_code}"
-                ):
-                    addresses.append(key.address())
-            else:
-                k = None
-                if wallet.addresstype == WalletAddressType.XPUB:
-                    k = network.parse.bip32_pub(wallet.address)
-                elif wallet.addresstype == WalletAddressType.YPUB:
-                    k = network.parse.bip49_pub(wallet.address)
-                elif wallet.addresstype == WalletAddressType.ZPUB:
-                    k = network.parse.bip84_pub(wallet.address)
-
-                if k == None:
-                    raise WalletAddressTypeError(
-                        f"Public key or addresstype is not a correct: {wallet}"
-                    )
-                for key in k.subkeys(
-                    f"{ca_code}/{batch_start}-{batch_start+batch_size}"
-                ):
-                    addresses.append(key.address())
-            txs_info = self.get_transaction_info(addresses)
-
-            print(
-                f"addresses from batch start: {batch_start}, {childtype}, {wallet.addresstype}"
-            )
-            for a in addresses:
-                print(f"address: {a}")
-
-            # Check if addresses have txs and repeat if they do
-            check_new_txs = False
-            for txinfo in txs_info:
-                childwallet = WalletChild(
-                    parent=wallet, used=True, address=txinfo.address, type=childtype
-                )
+        for childtype, chain in chains.items():
+            for txinfo in found[chain]:
                 log.debug(
                     f"Found tx info for {wallet.address:.10}: "
                     f"{txinfo.address}, nr txs: {txinfo.nr_txs}, "
                     f"received: {txinfo.total_received}, balance: {txinfo.final_balance}"
                 )
-                if txinfo.nr_txs == 0:
-                    childzero.append(childwallet)
-                else:
-                    if len(childzero) != 0:
-                        childwallets = childwallets + childzero
-                        childzero.clear()
-                    childwallets.append(childwallet)
-                    # Check new transactions, stay in while loop
-                    check_new_txs = True
-            batch_start = batch_start + batch_size + 1
+                childwallets.append(
+                    WalletChild(
+                        parent=wallet, used=True, address=txinfo.address, type=childtype
+                    )
+                )
         return childwallets
 
     def get_transactions(
         self, addresses: list[str], last_time: Timestamp = Timestamp(0)
     ) -> list[TransactionRaw]:
         log.debug(f"Start getting transactions for {self.site.name}")
-        result = _get_transactions_blockchaininfo(addresses, last_time)
+        result = self.provider.get_transactions(addresses, last_time)
         return result
 
+    def iter_transactions(
+        self, addresses: list[str], last_time: Timestamp = Timestamp(0)
+    ) -> Iterator[TransactionPage]:
+        log.debug(f"Start streaming transactions for {self.site.name}")
+        return self.provider.iter_transactions(addresses, last_time)
+
     def get_transaction_info(self, addresses: list[str]) -> list[TransactionInfo]:
         log.debug(
             f"Start getting transaction info for {len(addresses)} addresses on {self.site.name}. 1st Address {addresses[0]}"
         )
-        result = _get_transaction_info_blockchaininfo(addresses)
+        result = self.provider.get_transaction_info(addresses)
         return result
 
 
-def _get_transaction_info_blockchaininfo(addresses: list[str]) -> list[TransactionInfo]:
-    """May raise RemoteError or KeyError
-    Order is same
-    """
-    addresses_str = "|".join(addresses)
-    nr_txs: list[TransactionInfo] = []
-    backoff = config.BLOCKCHAININFO_BACKOFF
-    resp = request_get_dict(
-        url=f"https://blockchain.info/balance?active={addresses_str}",
-        handle_429=True,
-        backoff_in_seconds=backoff,
-    )
-    for address in addresses:
-        tx = resp[address]
-        txinfo = TransactionInfo(
-            address=address,
-            nr_txs=tx["n_tx"],
-            final_balance=tx["final_balance"],
-            total_received=tx["total_received"],
-        )
-        nr_txs.append(txinfo)
-    log.info(f"Limiting requests to 1 query per {backoff} seconds")
-    time.sleep(backoff)
-    return nr_txs
-
-
-def _get_transactions_blockchaininfo(
-    accounts: list[str], last_time: Timestamp = Timestamp(0)
-) -> list[TransactionRaw]:
-    """May raise RemoteError or KeyError
-    First tx from blockchain.info is newest
-    """
-    transactions: list[TransactionRaw] = []
-    backoff = config.BLOCKCHAININFO_BACKOFF
-    for acc in accounts:
-        finished = False
-        tx_i = 0
-        tx_time = 1
-        while not finished:
-            offset = tx_i
-            params = f"offset={offset}"
-
-            resp = request_get_dict(
-                url=f"https://blockchain.info/rawaddr/{acc}?{params}",
-                handle_429=True,
-                backoff_in_seconds=backoff,
-            )
-
-            n_tx = resp["n_tx"]
-            balance = resp["final_balance"]
-            txs = resp["txs"]
-            log.debug(f"Address {acc} has {n_tx} all time txns, balance={balance}")
-            log.debug(
-                f"Reading {len(txs)} txns from offset={offset}, last time={last_time} ({convert_timestamp(last_time)})"
-            )
-            for tx in txs:
-                tx_i = tx_i + 1
-                tx_type = TransactionType.UNDEF_UNDEFINED
-                tx_fee = 0
-                tx_value = 0
-                address_from = ""
-                address_to = ""
-                tx_time = tx["time"]
-
-                log.debug(f"Tx {tx_i}: {tx}")
-
-                if tx_time <= int(last_time):
-                    log.debug(
-                        f"Stop reading txns because tx time <= last time:"
-                        f"{tx_time} ({convert_timestamp(tx_time)} <= "
-                        f"{last_time} ({convert_timestamp(last_time)}"
-                    )
-                    break
-
-                # TODO: What if multiple inputs and acc == address_to? it always takes the last input address.
-                # This is not correct
-                for input in tx["inputs"]:
-                    address_from = input["prev_out"].get("addr", "0000")
-                    if address_from == acc:
-                        tx_type = TransactionType.OUT_UNDEFINED
-                        tx_fee = tx["fee"]
-                        if "value" in input:
-                            tx_value = input["value"]
-                        elif "value" in input["prev_out"]:
-                            tx_value = input["prev_out"]["value"]
-                        else:
-                            raise TransactionValueNotFoundError(
-                                f"Cannot find value of transaction input: {input}"
-                            )
-
-                # TODO: Transactions table can have row with same hash, output address is different
-                # TODO: Fee of transaction is connected to htxid (hash), don't count fee multiple time if hash is the same
-                # Acc is an input, so add all output as transactions
-                if tx_type == TransactionType.OUT_UNDEFINED:
-                    for output in tx["out"]:
-                        addr = output.get("addr", "unknown")
-                        tx_value = output["value"]
-
-                        txn = TransactionRaw(
-                            transactiontype=tx_type,
-                            timestamp=tx_time,
-                            txid=tx["hash"],
-                            quantity=tx_value,
-                            fee=tx_fee,
-                            from_wallet=address_from,
-                            to_wallet=address_to,
-                            quote_asset="BTC",
-                            fee_asset="BTC",
-                        )
-                        transactions.append(txn)
-                        timestr = convert_timestamp(tx_time)
-                        log.debug(f"{tx_i}: {tx_time} ({timestr}) - {txn.txid}")
+# Chain data providers by name, config.BITCOIN_PROVIDER selects one
+CHAIN_PROVIDERS: dict[str, type[ChainProvider]] = {
+    BlockchainInfo.name: BlockchainInfo,
+    Esplora.name: Esplora,
+}
 
-                # Check if acc is in outputs
-                else:
-                    for output in tx["out"]:
-                        addr = output.get("addr", "unknown")
-                        if addr == acc:
-                            tx_type = TransactionType.IN_UNDEFINED
-                            if address_from == "0000":
-                                tx_type = TransactionType.IN_MINING
-                            address_to = addr
-                            tx_value = output["value"]
 
-                    txn = TransactionRaw(
-                        transactiontype=tx_type,
-                        timestamp=tx_time,
-                        txid=tx["hash"],
-                        quantity=tx_value,
-                        fee=tx_fee,
-                        from_wallet=address_from,
-                        to_wallet=address_to,
-                        quote_asset="BTC",
-                        fee_asset="BTC",
-                    )
-                    transactions.append(txn)
-                    timestr = convert_timestamp(tx_time)
-                    log.debug(f"{tx_i}: {tx_time} ({timestr}) - {txn.txid}")
-
-            finished = tx_i >= n_tx or tx_time <= int(last_time)
-            log.info(f"Limiting requests to 1 query per {backoff} seconds")
-            time.sleep(backoff)
-
-    return transactions
+def get_chain_provider(name: str, base_url: str = "") -> ChainProvider:
+    """Chain data provider by name, raises ChainProviderError
+    base_url = url of the api, default from config.BITCOIN_PROVIDER_URLS"""
+    provider = CHAIN_PROVIDERS.get(name)
+    if provider == None:
+        raise ChainProviderError(
+            f"Chain data provider is not known: {name}, use one of {list(CHAIN_PROVIDERS)}"
+        )
+    return provider(base_url or config.BITCOIN_PROVIDER_URLS[name])
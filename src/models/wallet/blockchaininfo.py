@@ -0,0 +1,101 @@
+"""
+@author: Arno
+@created: 2026-10-17
+@modified: 2026-10-17
+
+Chain data provider for the api of blockchain.info
+
+"""
+import logging
+
+import config
+from src.data.types import TransactionInfo
+from src.models.wallet.chainprovider import (
+    ChainProvider,
+    ChainTx,
+    HistoryCursor,
+    HistoryPage,
+)
+from src.req.requesthelper import request_get_dict
+
+log = logging.getLogger(__name__)
+
+
+class BlockchainInfo(ChainProvider):
+    """Balances of many addresses in one request, the history of one address
+    with rawaddr and of many addresses with multiaddr. Both page by offset"""
+
+    name = "blockchain.info"
+
+    def __init__(self, base_url: str) -> None:
+        super().__init__(base_url)
+        # Read at creation, so a changed config is used by the next provider
+        self.history_batch_size = max(config.BLOCKCHAININFO_MULTIADDR_SIZE, 1)
+
+    def _request(self, path: str) -> dict:
+        return request_get_dict(
+            url=f"{self.base_url}/{path}",
+            handle_429=True,
+            backoff_in_seconds=config.BLOCKCHAININFO_BACKOFF,
+        )
+
+    def get_transaction_info(self, addresses: list[str]) -> list[TransactionInfo]:
+        """May raise RemoteError or KeyError
+        Order is same
+        """
+        addresses_str = "|".join(addresses)
+        nr_txs: list[TransactionInfo] = []
+        resp = self._request(f"balance?active={addresses_str}")
+        for address in addresses:
+            tx = resp[address]
+            txinfo = TransactionInfo(
+                address=address,
+                nr_txs=tx["n_tx"],
+                final_balance=tx["final_balance"],
+                total_received=tx["total_received"],
+            )
+            nr_txs.append(txinfo)
+        return nr_txs
+
+    def get_history(self, addresses: list[str], cursor: HistoryCursor) -> HistoryPage:
+        """May raise RemoteError or KeyError
+        First tx from blockchain.info is newest
+        """
+        offset = cursor.offset
+        if len(addresses) == 1:
+            acc = addresses[0]
+            resp = self._request(f"rawaddr/{acc}?offset={offset}")
+            n_tx = resp["n_tx"]
+            n_tx_address = {acc: n_tx}
+            log.debug(
+                f"Address {acc} has {n_tx} all time txns, balance={resp['final_balance']}"
+            )
+        else:
+            active = "|".join(addresses)
+            page_size = config.BLOCKCHAININFO_MULTIADDR_PAGE
+            resp = self._request(
+                f"multiaddr?active={active}&n={page_size}&offset={offset}"
+            )
+            n_tx = resp["wallet"]["n_tx"]
+            n_tx_address = {a["address"]: a["n_tx"] for a in resp["addresses"]}
+            log.debug(f"{len(addresses)} addresses have {n_tx} all time txns")
+
+        txs = [_convert_tx(tx) for tx in resp["txs"]]
+        offset = offset + len(txs)
+        next_cursor = HistoryCursor(
+            offset=offset, n_tx=n_tx, finished=offset >= n_tx or len(txs) == 0
+        )
+        return HistoryPage(txs, n_tx_address, next_cursor)
+
+
+def _convert_tx(tx: dict) -> ChainTx:
+    """Txn of blockchain.info, an input without address is from mining"""
+    inputs: list[tuple[str, int | None]] = []
+    for input in tx["inputs"]:
+        if "value" in input:
+            value = input["value"]
+        else:
+            value = input["prev_out"].get("value")
+        inputs.append((input["prev_out"].get("addr", "0000"), value))
+    outputs = [(output.get("addr", "unknown"), output["value"]) for output in tx["out"]]
+    return ChainTx(tx["hash"], tx["time"], tx.get("fee", 0), inputs, outputs)
@@ -0,0 +1,223 @@
+"""
+@author: Arno
+@created: 2026-10-17
+@modified: 2026-10-17
+
+Chain data provider, the api of a blockchain explorer for the Bitcoin sitemodel
+
+"""
+import logging
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Iterator
+
+from src.data.dbschemadata import TransactionPage, TransactionRaw
+from src.data.dbschematypes import TransactionType
+from src.data.types import Timestamp, TransactionInfo
+from src.errors.reqerrors import TransactionValueNotFoundError
+from src.func.helperfunc import convert_timestamp
+from src.req.ratelimiter import get_host
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class ChainTx:
+    """Dataclass for a transaction of a provider, the same for all providers
+    inputs and outputs are lists of (address, value)
+    Value of an input is None when the provider doesn't give it"""
+
+    txid: str
+    timestamp: int
+    fee: int
+    inputs: list[tuple[str, int | None]] = field(default_factory=list)
+    outputs: list[tuple[str, int]] = field(default_factory=list)
+
+    def addresses(self) -> set[str]:
+        """All input and output addresses"""
+        addresses = {address for address, _ in self.inputs}
+        addresses.update(address for address, _ in self.outputs)
+        return addresses
+
+
+@dataclass
+class HistoryCursor:
+    """Dataclass for the position in the combined history of addresses
+    offset = nr of txns read, newest first
+    last_txid = last txn read, for providers that page by txid
+    n_tx = all time nr of txns of the combined history, when known"""
+
+    offset: int = 0
+    last_txid: str = ""
+    n_tx: int = 0
+    finished: bool = False
+
+
+@dataclass
+class HistoryPage:
+    """Dataclass for one page of the combined history of addresses
+    n_tx = all time nr of txns per address
+    cursor = position after this page"""
+
+    txs: list[ChainTx]
+    n_tx: dict[str, int]
+    cursor: HistoryCursor
+
+
+class ChainProvider(ABC):
+    """Api of a blockchain explorer
+
+    constructor:
+        base_url(str): url of the api, can be a self-hosted or a replay server
+    usage:
+        provider = BlockchainInfo("https://blockchain.info")
+        infos = provider.get_transaction_info(addresses)
+        for page in provider.iter_transactions(addresses, last_time):
+            ...
+
+    A provider only implements the balance and history requests, the paging
+    over the history and the conversion to transactions are the same for all.
+    """
+
+    # Name in config.BITCOIN_PROVIDER
+    name = ""
+    # Maximum nr of addresses in one history request
+    history_batch_size = 1
+
+    def __init__(self, base_url: str) -> None:
+        self.base_url = base_url.rstrip("/")
+        # Requests to the same host share their limits
+        self.host = get_host(self.base_url)
+
+    @abstractmethod
+    def get_transaction_info(self, addresses: list[str]) -> list[TransactionInfo]:
+        """Balance and nr of txns per address, in the same order
+        May raise RemoteError or KeyError"""
+        pass
+
+    @abstractmethod
+    def get_history(self, addresses: list[str], cursor: HistoryCursor) -> HistoryPage:
+        """Next page of the combined history of the addresses, newest txn first
+        Sets finished on the cursor of the page after the oldest txn
+        May raise RemoteError or KeyError"""
+        pass
+
+    def iter_transactions(
+        self, addresses: list[str], last_time: Timestamp = Timestamp(0)
+    ) -> Iterator[TransactionPage]:
+        """Yields per history request one page with the txns of all its addresses
+        A txn that touches several of the addresses is read once"""
+        for i in range(0, len(addresses), self.history_batch_size):
+            batch = addresses[i : i + self.history_batch_size]
+            cursor = HistoryCursor()
+            while not cursor.finished:
+                page = self.get_history(batch, cursor)
+                log.debug(
+                    f"Reading {len(page.txs)} txns from offset={cursor.offset}, last time={last_time} ({convert_timestamp(last_time)})"
+                )
+                transactions: list[TransactionRaw] = []
+                tx_i = cursor.offset
+                for tx in page.txs:
+                    tx_i = tx_i + 1
+
+                    log.debug(f"Tx {tx_i}: {tx}")
+
+                    if tx.timestamp <= int(last_time):
+                        log.debug(
+                            f"Stop reading txns because tx time <= last time:"
+                            f"{tx.timestamp} ({convert_timestamp(tx.timestamp)} <= "
+                            f"{last_time} ({convert_timestamp(last_time)}"
+                        )
+                        page.cursor.finished = True
+                        break
+
+                    tx_addresses = tx.addresses()
+                    for acc in batch:
+                        if acc in tx_addresses:
+                            transactions.extend(convert_tx(tx, acc, tx_i))
+
+                cursor = page.cursor
+                yield TransactionPage(
+                    transactions,
+                    n_tx={acc: page.n_tx.get(acc, 0) for acc in batch},
+                    last=cursor.finished,
+                )
+
+    def get_transactions(
+        self, addresses: list[str], last_time: Timestamp = Timestamp(0)
+    ) -> list[TransactionRaw]:
+        """May raise RemoteError or KeyError"""
+        transactions: list[TransactionRaw] = []
+        for page in self.iter_transactions(addresses, last_time):
+            transactions.extend(page.transactions)
+        return transactions
+
+
+def convert_tx(tx: ChainTx, acc: str, tx_i: int) -> list[TransactionRaw]:
+    """Transactions of a txn for address acc
+    May raise TransactionValueNotFoundError
+    """
+    transactions: list[TransactionRaw] = []
+    tx_type = TransactionType.UNDEF_UNDEFINED
+    tx_fee = 0
+    tx_value = 0
+    address_from = ""
+    address_to = ""
+
+    # TODO: What if multiple inputs and acc == address_to? it always takes the last input address.
+    # This is not correct
+    for address_from, value in tx.inputs:
+        if address_from == acc:
+            tx_type = TransactionType.OUT_UNDEFINED
+            tx_fee = tx.fee
+            if value == None:
+                raise TransactionValueNotFoundError(
+                    f"Cannot find value of transaction input: {tx.txid} - {address_from}"
+                )
+            tx_value = value
+
+    # TODO: Transactions table can have row with same hash, output address is different
+    # TODO: Fee of transaction is connected to htxid (hash), don't count fee multiple time if hash is the same
+    # Acc is an input, so add all output as transactions
+    if tx_type == TransactionType.OUT_UNDEFINED:
+        for addr, tx_value in tx.outputs:
+            txn = TransactionRaw(
+                transactiontype=tx_type,
+                timestamp=tx.timestamp,
+                txid=tx.txid,
+                quantity=tx_value,
+                fee=tx_fee,
+                from_wallet=address_from,
+                to_wallet=address_to,
+                quote_asset="BTC",
+                fee_asset="BTC",
+            )
+            transactions.append(txn)
+            timestr = convert_timestamp(tx.timestamp)
+            log.debug(f"{tx_i}: {tx.timestamp} ({timestr}) - {txn.txid}")
+
+    # Check if acc is in outputs
+    else:
+        for addr, value in tx.outputs:
+            if addr == acc:
+                tx_type = TransactionType.IN_UNDEFINED
+                if address_from == "0000":
+                    tx_type = TransactionType.IN_MINING
+                address_to = addr
+                tx_value = value
+
+        txn = TransactionRaw(
+            transactiontype=tx_type,
+            timestamp=tx.timestamp,
+            txid=tx.txid,
+            quantity=tx_value,
+            fee=tx_fee,
+            from_wallet=address_from,
+            to_wallet=address_to,
+            quote_asset="BTC",
+            fee_asset="BTC",
+        )
+        transactions.append(txn)
+        timestr = convert_timestamp(tx.timestamp)
+        log.debug(f"{tx_i}: {tx.timestamp} ({timestr}) - {txn.txid}")
+    return transactions
@@ -0,0 +1,260 @@
+"""
+@author: Arno
+@created: 2026-10-17
+@modified: 2026-10-17
+
+Derivation of child addresses from a master public key
+
+"""
+import atexit
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
+
+from pycoin.networks.registry import network_for_netcode  # type: ignore
+
+import config
+from src.data.dbschematypes import WalletAddressType
+from src.errors.modelerrors import WalletAddressTypeError
+
+log = logging.getLogger(__name__)
+
+
+class KeyDerivation:
+    """Child addresses of one master public key
+
+    constructor:
+        pub(str): master public key, xpub, ypub, zpub or electrum mpk
+        addresstype(WalletAddressType): type of the master public key
+        netcode(str): network of pycoin
+    usage:
+        derivation = get_key_derivation(wallet.address, wallet.addresstype)
+        addresses = derivation.get_addresses(chain, start, end)
+
+    The key is parsed once. For bip32 keys the chain node (m/0 or m/1) is
+    kept, a child address costs one derivation from that node instead of two
+    from the master. Derived addresses are kept by index, only the indexes of
+    the requested range that are not known yet are derived, so a scan that
+    resumes at a stored index does not derive the indexes before it.
+    Many new indexes at once are derived in the process pool.
+    """
+
+    def __init__(
+        self, pub: str, addresstype: WalletAddressType, netcode: str = "BTC"
+    ) -> None:
+        self.pub = pub
+        self.addresstype = addresstype
+        self.netcode = netcode
+        self.key = parse_pub(pub, addresstype, netcode)
+        self.chain_nodes: dict[int, Any] = {}
+        # Per chain the derived addresses by index
+        self.addresses: dict[int, dict[int, str]] = {}
+        self.lock = threading.Lock()
+
+    def _chain_node(self, chain: int) -> Any:
+        node = self.chain_nodes.get(chain)
+        if node == None:
+            node = self.key.subkey(chain)
+            self.chain_nodes[chain] = node
+        return node
+
+    def derive_address(self, chain: int, index: int) -> str:
+        """Derive one child address, without the cache"""
+        if self.addresstype == WalletAddressType.ELECTRUM:
+            return self.key.subkey(f"{index}/{chain}").address()
+        return self._chain_node(chain).subkey(index).address()
+
+    def get_addresses(self, chain: int, start: int, end: int) -> list[str]:
+        """Child addresses of the chain from index start up to end
+        chain = 0 for receiving and 1 for change addresses"""
+        with self.lock:
+            derived = self.addresses.setdefault(chain, {})
+            missing = [index for index in range(start, end) if index not in derived]
+            if len(missing) >= config.DERIVATION_PARALLEL_MIN:
+                ranges = [
+                    (self.pub, self.addresstype, chain, first, last)
+                    for first, last in _index_ranges(missing)
+                ]
+                for (*_, first, last), addresses in zip(
+                    ranges, derive_addresses_bulk(ranges, netcode=self.netcode)
+                ):
+                    derived.update(zip(range(first, last), addresses))
+            else:
+                for index in missing:
+                    derived[index] = self.derive_address(chain, index)
+            return [derived[index] for index in range(start, end)]
+
+
+def _index_ranges(indexes: list[int]) -> list[tuple[int, int]]:
+    """Ascending indexes as (start, end) ranges of following indexes"""
+    ranges: list[tuple[int, int]] = []
+    for index in indexes:
+        if ranges and ranges[-1][1] == index:
+            ranges[-1] = (ranges[-1][0], index + 1)
+        else:
+            ranges.append((index, index + 1))
+    return ranges
+
+
+def parse_pub(pub: str, addresstype: WalletAddressType, netcode: str = "BTC") -> Any:
+    """Parse a master public key with pycoin, raises WalletAddressTypeError"""
+    network = network_for_netcode(netcode)
+    key = None
+    if addresstype == WalletAddressType.ELECTRUM:
+        key = network.parse.electrum_pub("E:" + pub)
+    elif addresstype == WalletAddressType.XPUB:
+        key = network.parse.bip32_pub(pub)
+    elif addresstype == WalletAddressType.YPUB:
+        key = network.parse.bip49_pub(pub)
+    elif addresstype == WalletAddressType.ZPUB:
+        key = network.parse.bip84_pub(pub)
+    if key == None:
+        raise WalletAddressTypeError(
+            f"Public key or addresstype is not a correct: {addresstype} - {pub}"
+        )
+    return key
+
+
+_derivations: OrderedDict[
+    tuple[str, WalletAddressType, str], KeyDerivation
+] = OrderedDict()
+_derivations_lock = threading.Lock()
+
+
+def get_key_derivation(
+    pub: str, addresstype: WalletAddressType, netcode: str = "BTC"
+) -> KeyDerivation:
+    """Derivation of a master public key, created at first use
+    The derivations of config.DERIVATION_CACHE_SIZE keys are kept,
+    least recently used is removed"""
+    key = (pub, addresstype, netcode)
+    with _derivations_lock:
+        derivation = _derivations.get(key)
+        if derivation == None:
+            derivation = KeyDerivation(pub, addresstype, netcode)
+            _derivations[key] = derivation
+            if len(_derivations) > config.DERIVATION_CACHE_SIZE:
+                _derivations.popitem(last=False)
+        else:
+            _derivations.move_to_end(key)
+        return derivation
+
+
+# (master public key, addresstype, chain, start index, end index)
+DerivationRange = tuple[str, WalletAddressType, int, int, int]
+
+_pool: ProcessPoolExecutor | None = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _derive_chunk(
+    pub: str,
+    addresstype: WalletAddressType,
+    netcode: str,
+    chain: int,
+    start: int,
+    end: int,
+) -> list[str]:
+    """Runs in a worker process, the key is parsed once per process"""
+    derivation = get_key_derivation(pub, addresstype, netcode)
+    return [derivation.derive_address(chain, index) for index in range(start, end)]
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """Process pool, started at first use and kept for the next bulk derivations
+    Spawned processes, forking a process with running threads is not safe.
+    The main program must start with if __name__ == "__main__" """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool == None or _pool_workers != workers:
+            if _pool != None:
+                _pool.shutdown()
+            _pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+            _pool_workers = workers
+        return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool != None:
+            _pool.shutdown()
+            _pool = None
+
+
+atexit.register(shutdown_pool)
+
+
+def derive_addresses_bulk(
+    ranges: list[DerivationRange], workers: int = 0, netcode: str = "BTC"
+) -> list[list[str]]:
+    """Derive the addresses of many ranges in a process pool
+
+    ranges = list of (master public key, addresstype, chain, start, end)
+    workers = nr of processes, 0 is config.DERIVATION_WORKERS or nr of cpus,
+        1 derives in this process
+    Returns per range the addresses from start up to end, in order
+    """
+    if workers == 0:
+        workers = config.DERIVATION_WORKERS or os.cpu_count() or 1
+    if workers == 1:
+        return [
+            _derive_chunk(pub, addresstype, netcode, chain, start, end)
+            for pub, addresstype, chain, start, end in ranges
+        ]
+    chunk_size = config.DERIVATION_CHUNK_SIZE
+    chunks: list[tuple] = []
+    nr_chunks: list[int] = []
+    for pub, addresstype, chain, start, end in ranges:
+        bounds = list(range(start, end, chunk_size))
+        nr_chunks.append(len(bounds))
+        for first in bounds:
+            last = min(first + chunk_size, end)
+            chunks.append((pub, addresstype, netcode, chain, first, last))
+    pool = _get_pool(workers)
+    # map keeps the order of the chunks
+    results = list(pool.map(_derive_chunk, *zip(*chunks))) if chunks else []
+    addresses: list[list[str]] = []
+    i = 0
+    for nr in nr_chunks:
+        addresses.append(
+            [address for chunk in results[i : i + nr] for address in chunk]
+        )
+        i += nr
+    return addresses
+
+
+def benchmark(nr_addresses: int = 2000, workers: tuple = (1, 2, 4, 8)) -> None:
+    """Addresses per second of the bulk derivation per nr of workers"""
+    network = network_for_netcode("BTC")
+    pub = network.keys.bip32_seed(b"arkfolio benchmark").hwif(as_private=False)
+    ranges = [(pub, WalletAddressType.XPUB, 0, 0, nr_addresses)]
+    expected = None
+    print(f"Deriving {nr_addresses} addresses, {os.cpu_count()} cpus")
+    for nr_workers in workers:
+        if nr_workers > 1:
+            # start the processes before timing
+            derive_addresses_bulk(
+                [(pub, WalletAddressType.XPUB, 1, 0, nr_workers)], nr_workers
+            )
+        start = time.perf_counter()
+        result = derive_addresses_bulk(ranges, nr_workers)
+        elapsed = time.perf_counter() - start
+        if expected == None:
+            expected = result
+        same = "" if result == expected else ", different result"
+        print(f"{nr_workers} workers: {nr_addresses / elapsed:8.0f} addresses/s{same}")
+    shutdown_pool()
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
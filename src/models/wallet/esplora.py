@@ -0,0 +1,102 @@
+"""
+@author: Arno
+@created: 2026-10-17
+@modified: 2026-10-17
+
+Chain data provider for an Esplora compatible api, blockstream.info,
+mempool.space or a self-hosted electrs
+
+"""
+import logging
+
+import config
+from src.data.types import TransactionInfo
+from src.models.wallet.chainprovider import (
+    ChainProvider,
+    ChainTx,
+    HistoryCursor,
+    HistoryPage,
+)
+from src.req.requesthelper import request_get, request_get_dict
+
+log = logging.getLogger(__name__)
+
+
+class Esplora(ChainProvider):
+    """One address per request. The confirmed history pages by the txid of
+    the last txn read, unconfirmed txns are not read"""
+
+    name = "esplora"
+    history_batch_size = 1
+    # Nr of confirmed txns per history request of the api
+    page_size = 25
+
+    def _request(self, path: str) -> dict | list:
+        return request_get(
+            url=f"{self.base_url}/{path}",
+            handle_429=True,
+            backoff_in_seconds=config.ESPLORA_BACKOFF,
+        )
+
+    def _get_address(self, address: str) -> dict:
+        return request_get_dict(
+            url=f"{self.base_url}/address/{address}",
+            handle_429=True,
+            backoff_in_seconds=config.ESPLORA_BACKOFF,
+        )
+
+    def get_transaction_info(self, addresses: list[str]) -> list[TransactionInfo]:
+        """May raise RemoteError or KeyError
+        Order is same
+        """
+        nr_txs: list[TransactionInfo] = []
+        for address in addresses:
+            stats = self._get_address(address)["chain_stats"]
+            txinfo = TransactionInfo(
+                address=address,
+                nr_txs=stats["tx_count"],
+                final_balance=stats["funded_txo_sum"] - stats["spent_txo_sum"],
+                total_received=stats["funded_txo_sum"],
+            )
+            nr_txs.append(txinfo)
+        return nr_txs
+
+    def get_history(self, addresses: list[str], cursor: HistoryCursor) -> HistoryPage:
+        """May raise RemoteError or KeyError
+        First tx from esplora is newest
+        """
+        acc = addresses[0]
+        n_tx = cursor.n_tx
+        if cursor.last_txid == "":
+            n_tx = self._get_address(acc)["chain_stats"]["tx_count"]
+            log.debug(f"Address {acc} has {n_tx} all time txns")
+        path = f"address/{acc}/txs/chain"
+        if cursor.last_txid != "":
+            path = f"{path}/{cursor.last_txid}"
+        resp = self._request(path)
+        assert isinstance(resp, list)
+
+        txs = [_convert_tx(tx) for tx in resp]
+        offset = cursor.offset + len(txs)
+        next_cursor = HistoryCursor(
+            offset=offset,
+            last_txid=txs[-1].txid if txs else cursor.last_txid,
+            n_tx=n_tx,
+            finished=offset >= n_tx or len(txs) < self.page_size,
+        )
+        return HistoryPage(txs, {acc: n_tx}, next_cursor)
+
+
+def _convert_tx(tx: dict) -> ChainTx:
+    """Txn of esplora, a coinbase input has no prevout and is from mining"""
+    inputs: list[tuple[str, int | None]] = []
+    for input in tx["vin"]:
+        prevout = input.get("prevout") or {}
+        inputs.append(
+            (prevout.get("scriptpubkey_address", "0000"), prevout.get("value"))
+        )
+    outputs = [
+        (output.get("scriptpubkey_address", "unknown"), output["value"])
+        for output in tx["vout"]
+    ]
+    return ChainTx(tx["txid"], tx["status"]["block_time"], tx["fee"], inputs, outputs)
@@ -0,0 +1,85 @@
+"""
+@author: Arno
+@created: 2026-10-17
+@modified: 2026-10-17
+
+Gap limit scanner for the used child addresses of a master public key
+
+"""
+import logging
+from typing import Callable
+
+from src.data.types import TransactionInfo
+from src.models.wallet.derivation import KeyDerivation
+
+log = logging.getLogger(__name__)
+
+
+def scan_gap_limit(
+    derivation: KeyDerivation,
+    starts: dict[int, int],
+    get_transaction_info: Callable[[list[str]], list[TransactionInfo]],
+    gap_limit: int,
+    batch_size: int,
+    window_max: int = 0,
+) -> dict[int, list[TransactionInfo]]:
+    """Find the used child addresses of several chains at once
+
+    starts = per chain (0 receiving, 1 change) the first index to check
+    get_transaction_info = balance request for a list of addresses
+    gap_limit = a chain stops after this nr of unused addresses in a row
+    batch_size = maximum nr of addresses per balance request
+    window_max = maximum nr of addresses derived ahead of the requests,
+        0 derives only the addresses of the next request
+
+    Every request checks all chains that are not finished. The request is
+    filled up to batch_size, addresses after the gap of a chain are not used.
+    The addresses are derived in windows ahead of the requests. The window of
+    a chain doubles every time the scan passes it, so a long used chain gets
+    windows large enough for the process pool of the derivation.
+    Returns per chain the info from the start index up to the last used
+    address, including the unused addresses in between
+    """
+    last_used = {chain: start - 1 for chain, start in starts.items()}
+    checked = dict(starts)
+    infos: dict[int, list[TransactionInfo]] = {chain: [] for chain in starts}
+    derived = dict(starts)
+    window = {chain: min(batch_size, window_max) for chain in starts}
+    nr_requests = 0
+    while True:
+        active = [c for c in starts if checked[c] <= last_used[c] + gap_limit]
+        if len(active) == 0:
+            break
+        per_chain = max(batch_size // len(active), 1)
+        for chain in active:
+            if checked[chain] + per_chain > derived[chain] and window[chain] > 0:
+                derived[chain] = checked[chain] + max(window[chain], per_chain)
+                derivation.get_addresses(chain, checked[chain], derived[chain])
+                window[chain] = min(window[chain] * 2, window_max)
+        addresses = {
+            chain: derivation.get_addresses(
+                chain, checked[chain], checked[chain] + per_chain
+            )
+            for chain in active
+        }
+        txs_info = get_transaction_info(
+            [address for chain in active for address in addresses[chain]]
+        )
+        nr_requests += 1
+        info_per_address = {txinfo.address: txinfo for txinfo in txs_info}
+        for chain in active:
+            for address in addresses[chain]:
+                index = checked[chain]
+                if index > last_used[chain] + gap_limit:
+                    break
+                txinfo = info_per_address.get(address, TransactionInfo(address))
+                infos[chain].append(txinfo)
+                if txinfo.nr_txs > 0:
+                    last_used[chain] = index
+                checked[chain] = index + 1
+    log.debug(
+        f"Gap limit scan in {nr_requests} requests, last used index per chain: {last_used}"
+    )
+    return {
+        chain: infos[chain][: last_used[chain] - starts[chain] + 1] for chain in starts
+    }
@@ -0,0 +1,116 @@
+"""
+@author: Arno
+@created: 2026-10-17
+@modified: 2026-10-17
+
+Rate limiter per host, shared by all sitemodels and threads
+
+"""
+import asyncio
+import logging
+import threading
+import time
+from urllib.parse import urlparse
+
+import config
+
+log = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Token bucket for the requests to one host
+
+    constructor:
+        requests(int): nr of requests allowed per window
+        window(float): length of the window in seconds
+        burst(int): maximum nr of requests at once after an idle time
+    usage:
+        limiter = get_rate_limiter(url)
+        limiter.acquire()
+        response = requests.get(url)
+
+    A request takes a token, tokens come back at requests / window per second.
+    Only the time until the next token is waited, the time of the request
+    itself is already counted. Waiting callers reserve their token inside the
+    lock and sleep outside it, so they are served in order of arrival.
+    """
+
+    def __init__(self, requests: int, window: float, burst: int = 1) -> None:
+        self.rate = requests / window
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """Take a token, returns the seconds to wait before it may be used"""
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+            return max(wait, self.paused_until - now)
+
+    def try_acquire(self) -> bool:
+        """Take a token if there is one now, returns False instead of waiting"""
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self.tokens < 1 or self.paused_until > now:
+                return False
+            self.tokens -= 1
+            return True
+
+    def acquire(self) -> float:
+        """Wait until a request may be done, returns the waited seconds"""
+        wait = self.reserve()
+        if wait > 0:
+            log.debug(f"Rate limit, waiting {wait:.1f} seconds")
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self) -> float:
+        """Like acquire, without blocking the event loop"""
+        wait = self.reserve()
+        if wait > 0:
+            log.debug(f"Rate limit, waiting {wait:.1f} seconds")
+            await asyncio.sleep(wait)
+        return wait
+
+    def pause(self, seconds: float) -> None:
+        """No requests for the next seconds, for example after a 429 response"""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+_limiters: dict[str, RateLimiter | None] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_host(url: str) -> str:
+    return urlparse(url).hostname or ""
+
+
+def get_rate_limiter(url: str) -> RateLimiter | None:
+    """Rate limiter of the host of the url, created at first use
+
+    The budget of a host is in config.RATE_LIMITS
+    Returns None when the host has no budget
+    """
+    host = get_host(url)
+    with _limiters_lock:
+        if host not in _limiters:
+            budget = config.RATE_LIMITS.get(host)
+            _limiters[host] = None if budget == None else RateLimiter(*budget)
+        return _limiters[host]
+
+
+def acquire(url: str) -> float:
+    """Wait for the rate limit of the host of the url"""
+    limiter = get_rate_limiter(url)
+    return 0.0 if limiter == None else limiter.acquire()
@@ -0,0 +1,203 @@
+"""
+@author: Arno
+@created: 2026-10-17
+@modified: 2026-10-17
+
+Local http server that replays recorded api responses, to measure the
+throughput of the chain data providers without the real sites
+
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import unquote
+
+from src.errors.reqerrors import RemoteError
+from src.req.ratelimiter import RateLimiter
+from src.req.requesthelper import query_file
+
+log = logging.getLogger(__name__)
+
+
+class ReplayServer:
+    """Serves the recorded responses of a fixtures file
+
+    constructor:
+        fixtures(str): json file with per path and query {"status", "body"}
+        latency(float): seconds before every response
+        rate(tuple): (requests, window, burst), more requests get a 429
+        retry_after(int): Retry-After header of a 429, 0 is without header
+        upstream(str): url of the real api, missing paths are recorded from it
+    usage:
+        with ReplayServer("fixtures.json", latency=0.05) as server:
+            provider = get_chain_provider("esplora", server.url)
+
+    A path without fixture gets a 404, or is requested from upstream when it
+    is set. Recorded responses are written to the fixtures file at close.
+    """
+
+    def __init__(
+        self,
+        fixtures: str,
+        latency: float = 0.0,
+        rate: tuple[int, float, int] | None = None,
+        retry_after: int = 0,
+        upstream: str = "",
+    ) -> None:
+        self.fixtures_file = fixtures
+        self.fixtures: dict[str, dict[str, Any]] = {}
+        if os.path.isfile(fixtures):
+            with open(fixtures, encoding="utf-8") as f:
+                self.fixtures = json.load(f)
+        self.latency = latency
+        self.limiter = RateLimiter(*rate) if rate != None else None
+        self.retry_after = retry_after
+        self.upstream = upstream.rstrip("/")
+        self.recorded = 0
+        self.stats = {"requests": 0, "429": 0, "404": 0}
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self.thread = threading.Thread()
+
+    def __enter__(self) -> "ReplayServer":
+        self.start()
+        return self
+
+    def __exit__(self, type, value, traceback) -> None:
+        self.close()
+
+    def start(self) -> None:
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, name="ReplayServer", daemon=True
+        )
+        self.thread.start()
+        log.info(f"Replay server on {self.url}, {len(self.fixtures)} fixtures")
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        if self.recorded > 0:
+            with open(self.fixtures_file, "w", encoding="utf-8") as f:
+                json.dump(self.fixtures, f)
+            log.info(f"Recorded {self.recorded} fixtures in {self.fixtures_file}")
+
+    def _count(self, key: str) -> None:
+        with self.lock:
+            self.stats[key] += 1
+
+    def _record(self, path: str) -> dict[str, Any] | None:
+        if self.upstream == "":
+            return None
+        try:
+            body = query_file(f"{self.upstream}{path}", is_json=True)
+        except RemoteError as e:
+            log.debug(f"Replay server cannot record {path}: {e}")
+            return {"status": HTTPStatus.BAD_GATEWAY, "body": {"error": str(e)}}
+        fixture = {"status": HTTPStatus.OK, "body": body}
+        with self.lock:
+            self.fixtures[path] = fixture
+            self.recorded += 1
+        return fixture
+
+    def respond(self, path: str) -> tuple[int, dict[str, str], Any]:
+        """Status, headers and body of the response to a path with query"""
+        self._count("requests")
+        if self.latency > 0:
+            time.sleep(self.latency)
+        if self.limiter != None and not self.limiter.try_acquire():
+            self._count("429")
+            headers = {}
+            if self.retry_after > 0:
+                headers["Retry-After"] = str(self.retry_after)
+            return HTTPStatus.TOO_MANY_REQUESTS, headers, {"error": "Too many requests"}
+        fixture = self.fixtures.get(path)
+        if fixture == None:
+            fixture = self._record(path)
+        if fixture == None:
+            self._count("404")
+            log.debug(f"Replay server has no fixture for {path}")
+            return HTTPStatus.NOT_FOUND, {}, {"error": f"No fixture for {path}"}
+        return fixture["status"], {}, fixture["body"]
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        replay = self
+
+        class ReplayHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive like the real sites
+            # headers and body are separate writes, no delayed ack in between
+            disable_nagle_algorithm = True
+
+            def do_GET(self) -> None:
+                # fixtures are stored with the unquoted path
+                status, headers, body = replay.respond(unquote(self.path))
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                log.debug(f"Replay server: {format % args}")
+
+        return ReplayHandler
+
+
+def benchmark(
+    fixtures: str,
+    provider_name: str,
+    addresses: list[str],
+    latency: float = 0.0,
+    rate: tuple[int, float, int] | None = None,
+    retry_after: int = 1,
+    upstream: str = "",
+) -> None:
+    """Requests and txns per second of a chain data provider on the replay server
+    With upstream the responses are recorded first, the next run is offline"""
+    from src.models.wallet.bitcoin import get_chain_provider
+
+    with ReplayServer(fixtures, latency, rate, retry_after, upstream) as server:
+        provider = get_chain_provider(provider_name, server.url)
+        start = time.perf_counter()
+        infos = provider.get_transaction_info(addresses)
+        transactions = provider.get_transactions(addresses)
+        elapsed = time.perf_counter() - start
+        stats = dict(server.stats)
+    print(
+        f"{provider_name}: {len(infos)} addresses, {len(transactions)} txns, "
+        f"{stats['requests']} requests in {elapsed:.2f}s, "
+        f"{stats['requests'] / elapsed:.1f} requests/s, "
+        f"{len(transactions) / elapsed:.1f} txns/s, "
+        f"{stats['429']} times 429, {stats['404']} missing fixtures"
+    )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4:
+        print(
+            "Usage: python -m src.req.replayserver fixtures.json provider "
+            "address,address [latency] [requests per second] [upstream url]"
+        )
+        sys.exit(1)
+    requests_per_second = int(sys.argv[5]) if len(sys.argv) > 5 else 0
+    benchmark(
+        fixtures=sys.argv[1],
+        provider_name=sys.argv[2],
+        addresses=sys.argv[3].split(","),
+        latency=float(sys.argv[4]) if len(sys.argv) > 4 else 0.0,
+        rate=(requests_per_second, 1, requests_per_second)
+        if requests_per_second > 0
+        else None,
+        upstream=sys.argv[6] if len(sys.argv) > 6 else "",
+    )
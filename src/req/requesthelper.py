@@ -1,7 +1,7 @@
 """
 @author: Arno
 @created: 2022-04-21
-@modified: 2023-05-20
+@modified: 2026-10-17
 
 Request URL Helper to get response from API 
 """
@@ -13,11 +13,11 @@ from http import HTTPStatus
 from typing import Any, Callable, Literal, Union, overload
 
 import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 
 import config
 from src.errors.reqerrors import RemoteError
+from src.req import ratelimiter
+from src.req.sessionpool import get_session, new_session
 
 log = logging.getLogger(__name__)
 
@@ -33,19 +33,9 @@ class RequestHelper:
 
     @staticmethod
     def _init_session():
-        """Initialization of the session"""
-        session = requests.Session()
-        # session.headers.update({'Accept': 'application/json'})
-        retry = Retry(
-            total=config.REQUESTS_RETRIES,
-            backoff_factor=1.5,
-            respect_retry_after_header=False,  # False: show sleep time via this class
-            status_forcelist=[502, 503, 504],
-        )
-        adapter = HTTPAdapter(max_retries=retry)
-        session.mount("http://", adapter)
-        session.mount("https://", adapter)
-        return session
+        """Initialization of the session, own session for the own headers
+        Retries and status handling are the defaults of new_session"""
+        return new_session()
 
     def update_header(self, params: dict):
         """Update the header of the session
@@ -68,6 +58,7 @@ class RequestHelper:
 
         while True:
             try:
+                ratelimiter.acquire(url)
                 response = self.session.get(
                     url, timeout=request_timeout, stream=stream, verify=verify
                 )
@@ -242,12 +233,18 @@ def retry_calls(
 
     Can also handle to many request (429) errors with a specific backoff in seconds if required.
 
+    Every try waits first for the rate limit of the host. A 429 backoff pauses
+    all requests to the host, not only this one.
+
     - Raises RemoteError if there is something wrong with contacting the remote
     """
     tries = retries
+    limiter = ratelimiter.get_rate_limiter(url)
     while True:
         try:
-            result = requests.get(url=url, timeout=timeout, **kwargs)
+            if limiter != None:
+                limiter.acquire()
+            result = get_session(url).get(url=url, timeout=timeout, **kwargs)
 
             if handle_429 and result.status_code == HTTPStatus.TOO_MANY_REQUESTS:
                 if tries == 0:
@@ -261,13 +258,16 @@ def retry_calls(
                         f"In retry_call for {location}-{url}. Got 429. Retrying after "
                         f"{sleep_time} seconds",
                     )
-                    time.sleep(sleep_time)
                 else:
                     log.debug(
                         f"In retry_call for {location}-{url}. Got 429. Backing off for "
                         f"{backoff_in_seconds} seconds",
                     )
-                    time.sleep(backoff_in_seconds)
+                    sleep_time = backoff_in_seconds
+                if limiter == None:
+                    time.sleep(sleep_time)
+                else:
+                    limiter.pause(sleep_time)
                 tries -= 1
                 continue
 
@@ -308,7 +308,8 @@ def query_file(url: str, is_json: bool = False) -> Union[str, dict[str, Any]]:
     and is_json is set to true.
     """
     try:
-        response = requests.get(url=url, timeout=config.REQUESTS_TIMEOUT)
+        ratelimiter.acquire(url)
+        response = get_session(url).get(url=url, timeout=config.REQUESTS_TIMEOUT)
     except requests.exceptions.RequestException as e:
         raise RemoteError(f"Failed to query file {url} due to: {e!s}") from e
 
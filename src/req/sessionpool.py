@@ -0,0 +1,107 @@
+"""
+@author: Arno
+@created: 2026-10-17
+@modified: 2026-10-17
+
+Pooled keep-alive sessions per host, shared by all request functions
+
+"""
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import config
+from src.req.ratelimiter import get_host
+
+log = logging.getLogger(__name__)
+
+
+def new_session(
+    pool_size: int = 1,
+    retries: int = config.REQUESTS_RETRIES,
+    raise_on_status: bool = True,
+) -> requests.Session:
+    """Session with the retry policy and compression of the program
+
+    pool_size = nr of connections kept alive per host
+    retries = retries on connection errors and 502, 503, 504
+    raise_on_status = raise a RetryError when the retries of a status run out,
+                      False returns the last response to the caller
+    """
+    session = requests.Session()
+    session.headers.update(
+        {"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"}
+    )
+    retry = Retry(
+        total=retries,
+        backoff_factor=config.REQUESTS_BACKOFF_FACTOR,
+        respect_retry_after_header=False,  # 429 is handled by retry_calls
+        status_forcelist=[502, 503, 504],
+        raise_on_status=raise_on_status,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+_sessions: dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(url: str) -> requests.Session:
+    """Session of the host of the url, created at first use
+
+    The connections of a host are reused by all threads, so there is only
+    one tcp and tls handshake per connection instead of per request
+    """
+    host = get_host(url)
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session == None:
+            # retry_calls retries itself and reports the status of the last
+            # response, so fewer retries here and no RetryError
+            session = new_session(
+                config.REQUESTS_POOL_SIZE,
+                retries=config.REQUESTS_POOL_RETRIES,
+                raise_on_status=False,
+            )
+            _sessions[host] = session
+        return session
+
+
+def get_pool_stats() -> dict[str, tuple[int, int]]:
+    """Per host (nr of new connections, nr of requests)"""
+    stats: dict[str, tuple[int, int]] = {}
+    with _sessions_lock:
+        for host, session in _sessions.items():
+            connections = 0
+            nr_requests = 0
+            # the same adapter is mounted for http and https
+            for adapter in set(session.adapters.values()):
+                poolmanager = adapter.poolmanager  # type: ignore
+                for key in poolmanager.pools.keys():
+                    pool = poolmanager.pools.get(key)
+                    if pool != None:
+                        connections += pool.num_connections
+                        nr_requests += pool.num_requests
+            stats[host] = (connections, nr_requests)
+    return stats
+
+
+def log_stats() -> None:
+    for host, (connections, nr_requests) in get_pool_stats().items():
+        log.info(
+            f"Sessions {host}: {nr_requests} requests over {connections} connections, "
+            f"{max(nr_requests - connections, 0)} handshakes saved"
+        )
+
+
+def close_sessions() -> None:
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
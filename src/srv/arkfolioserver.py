@@ -1,21 +1,29 @@
 """
 @author: Arno
 @created: 2023-05-18
-@modified: 2023-08-26
+@modified: 2026-10-17
 
 Server for ArkFolio
 
 """
 import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 
 from requests import RequestException
 
+import config
 from src.data.dbschemadata import Wallet
 from src.db.db import Db
+from src.db.dbaddresscache import get_address_cache
 from src.db.dbinit import db_init
 from src.errors.dberrors import DbError
 from src.models.sitemodel import SiteModel
 from src.models.sitemodelfinder import find_all_sitemodels
+from src.req import sessionpool
+from src.srv.dbwriter import DbWriter
+from src.srv.fetchengine import FetchEngine
 from src.srv.serverhelper import get_wallets_per_site
 
 log = logging.getLogger(__name__)
@@ -32,6 +40,9 @@ class ArkfolioServer:
             log.debug(f"Sitemodel: {sitemodel}")
             sitemodel.model_dbinit(self.db)
             sitemodel.asset_dbinit(self.db)
+        # Per site id (start, end) of searching its wallets
+        self.site_times: dict[int, tuple[float, float]] = {}
+        self.site_times_lock = threading.Lock()
 
     def run(self):
         log.info("Starting Arkfolio server")
@@ -39,23 +50,30 @@ class ArkfolioServer:
         # Go through all wallets to get new transactions
         self.process_wallets()
 
+        self.log_site_times()
+        get_address_cache(self.db).log_stats()
+        sessionpool.log_stats()
+        if self.db.stats != None:
+            self.db.stats.log_summary()
+
     def process_wallets(self):
         sites_wallets: dict[int, list[Wallet]] = get_wallets_per_site(
             self.sitemodels, self.db
         )
         log.debug(f"Found sitemodels: {self.sitemodels}")
         log.debug(f"Found wallets: {sites_wallets}")
-
-        for siteid, wallets in sites_wallets.items():
-            for wallet in wallets:
-                # TODO: This must be done every day...
-                # TODO: Errors, like no connection, database fault must be shown to user
-                try:
-                    self.sitemodels[siteid].search_transactions(self.db, wallet)
-                except (DbError, RequestException) as e:
-                    log.exception(f"Error: {e}")
-
-            log.debug(f"Wallets for {self.sitemodels[siteid].site.name} updated")
+        self.site_times.clear()
+
+        if config.SERVER_FETCH_MODE == "async":
+            self.process_wallets_async(sites_wallets)
+        elif config.SERVER_FETCH_MODE == "threads":
+            self.process_wallets_threads(sites_wallets)
+        else:
+            for siteid, wallets in sites_wallets.items():
+                for wallet in wallets:
+                    # TODO: This must be done every day...
+                    self.search_wallet(siteid, wallet)
+                log.debug(f"Wallets for {self.sitemodels[siteid].site.name} updated")
 
         # For blockchain wallet: do this per wallet address or per chain api
         # with use of asyncio, ccxt
@@ -64,6 +82,89 @@ class ArkfolioServer:
         # assets_f_prices: list[asset] = get_all_assets_prices()
         # retrieve new prices or historical prices if needed
 
+    def process_wallets_threads(self, sites_wallets: dict[int, list[Wallet]]):
+        """Every site has its own pool of worker threads, so a slow site does
+        not hold up the others. The workers hand all writes to one database writer
+        Nr of workers per site name is in config.SERVER_SITE_WORKERS"""
+        executors: dict[int, ThreadPoolExecutor] = {}
+        futures: dict[Future, int] = {}
+        with DbWriter() as writer:
+            for siteid, wallets in sites_wallets.items():
+                site = self.sitemodels[siteid].site
+                workers = config.SERVER_SITE_WORKERS.get(
+                    site.name, config.SERVER_SITE_WORKERS_DEFAULT
+                )
+                executors[siteid] = ThreadPoolExecutor(
+                    max_workers=workers, thread_name_prefix=site.name
+                )
+                for wallet in wallets:
+                    future = executors[siteid].submit(
+                        self.search_wallet, siteid, wallet, writer
+                    )
+                    futures[future] = siteid
+            for future in as_completed(futures):
+                exception = future.exception()
+                if exception != None:
+                    log.error(f"Error: {exception!r}")
+            for siteid, executor in executors.items():
+                executor.shutdown()
+                log.debug(f"Wallets for {self.sitemodels[siteid].site.name} updated")
+
+    def process_wallets_async(self, sites_wallets: dict[int, list[Wallet]]):
+        """All wallets at the same time, within the limits of the host of each site
+        The fetched transactions are written by one database writer"""
+        with DbWriter() as writer:
+            engine = FetchEngine(writer)
+            jobs = [
+                self.search_wallet_async(engine, siteid, wallet)
+                for siteid, wallets in sites_wallets.items()
+                for wallet in wallets
+            ]
+            results = engine.run(jobs)
+        for result in results:
+            if isinstance(result, BaseException):
+                log.error(f"Error: {result!r}")
+        for siteid in sites_wallets:
+            log.debug(f"Wallets for {self.sitemodels[siteid].site.name} updated")
+
+    def search_wallet(
+        self, siteid: int, wallet: Wallet, writer: DbWriter | None = None
+    ) -> None:
+        start = time.perf_counter()
+        # TODO: Errors, like no connection, database fault must be shown to user
+        try:
+            self.sitemodels[siteid].search_transactions(self.db, wallet, writer)
+        except (DbError, RequestException) as e:
+            log.exception(f"Error: {e}")
+        finally:
+            self.add_site_time(siteid, start, time.perf_counter())
+
+    async def search_wallet_async(
+        self, engine: FetchEngine, siteid: int, wallet: Wallet
+    ):
+        start = time.perf_counter()
+        try:
+            await self.sitemodels[siteid].search_transactions_async(
+                engine, self.db, wallet
+            )
+        except (DbError, RequestException) as e:
+            log.exception(f"Error: {e}")
+        finally:
+            self.add_site_time(siteid, start, time.perf_counter())
+
+    def add_site_time(self, siteid: int, start: float, end: float) -> None:
+        """Wall time of a site is from the start of its first wallet
+        to the end of its last wallet"""
+        with self.site_times_lock:
+            first, last = self.site_times.get(siteid, (start, end))
+            self.site_times[siteid] = (min(first, start), max(last, end))
+
+    def log_site_times(self) -> None:
+        for siteid, (first, last) in self.site_times.items():
+            log.info(
+                f"Wall time {self.sitemodels[siteid].site.name}: {last - first:.1f} s"
+            )
+
 
 # User has to add a wallet or exchange,
 # this will add a wallet and a site for interfacing
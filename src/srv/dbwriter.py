@@ -0,0 +1,89 @@
+"""
+@author: Arno
+@created: 2026-10-17
+@modified: 2026-10-17
+
+Single thread that does all writes to the database
+
+"""
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable
+
+log = logging.getLogger(__name__)
+
+
+class DbWriter:
+    """Runs the submitted database functions one by one on its own thread
+
+    constructor:
+        name(str): name of the writer thread
+    usage:
+        with DbWriter() as writer:
+            future = writer.submit(insert_transaction_page, db, wallet, page)
+            future.result()
+
+    Fetching threads or tasks hand their results to the writer, so there is
+    only one writer for the database and the writes are never interleaved.
+    An exception of a function is set on its future, the writer continues.
+    """
+
+    def __init__(self, name: str = "DbWriter") -> None:
+        self.queue: queue.Queue[
+            tuple[Future, Callable, tuple, dict] | None
+        ] = queue.Queue()
+        self.name = name
+        self.thread = threading.Thread()
+        self.started = False
+
+    def __enter__(self) -> "DbWriter":
+        self.start()
+        return self
+
+    def __exit__(self, type, value, traceback) -> None:
+        self.close()
+
+    def start(self) -> None:
+        if not self.started:
+            self.thread = threading.Thread(
+                target=self._run, name=self.name, daemon=True
+            )
+            self.thread.start()
+            self.started = True
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        """Queue a function for the writer thread, returns the future of its result"""
+        if not self.started:
+            raise RuntimeError("Database writer is not started")
+        future: Future = Future()
+        self.queue.put((future, fn, args, kwargs))
+        return future
+
+    def call(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run a function on the writer thread and wait for its result"""
+        if threading.current_thread() is self.thread:
+            return fn(*args, **kwargs)
+        return self.submit(fn, *args, **kwargs).result()
+
+    def close(self) -> None:
+        """Finish all queued functions and stop the writer thread"""
+        if self.started:
+            self.queue.put(None)
+            self.thread.join()
+            self.started = False
+
+    def _run(self) -> None:
+        while True:
+            item = self.queue.get()
+            if item == None:
+                break
+            future, fn, args, kwargs = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                log.debug(f"Database writer: {fn.__name__} raised {e!r}")
+                future.set_exception(e)
@@ -0,0 +1,77 @@
+"""
+@author: Arno
+@created: 2026-10-17
+@modified: 2026-10-17
+
+Asyncio engine to fetch from the sites in parallel
+
+"""
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator
+
+import config
+from src.srv.dbwriter import DbWriter
+
+log = logging.getLogger(__name__)
+
+
+class FetchEngine:
+    """Runs the fetch coroutines of the sitemodels in one event loop
+
+    constructor:
+        writer(DbWriter): the one writer, all database writes are handed to it
+    usage:
+        with DbWriter() as writer:
+            engine = FetchEngine(writer)
+            engine.run([sitemodel.search_transactions_async(engine, db, wallet)])
+
+    The blocking request functions run in worker threads. The nr of requests
+    at the same time per host is limited by config.FETCH_CONCURRENCY, the
+    requests per time by the rate limiter of the host in the request functions.
+    """
+
+    def __init__(self, writer: DbWriter) -> None:
+        self.writer = writer
+        self.semaphores: dict[str, asyncio.Semaphore] = {}
+
+    def _semaphore(self, host: str) -> asyncio.Semaphore:
+        semaphore = self.semaphores.get(host)
+        if semaphore == None:
+            limit = config.FETCH_CONCURRENCY.get(host, config.FETCH_CONCURRENCY_DEFAULT)
+            semaphore = asyncio.Semaphore(limit)
+            self.semaphores[host] = semaphore
+        return semaphore
+
+    async def fetch(self, host: str, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run a blocking fetch function in a worker thread, within the host limit"""
+        async with self._semaphore(host):
+            return await asyncio.to_thread(fn, *args)
+
+    async def iter_fetch(
+        self, host: str, iterator: Iterator[Any]
+    ) -> AsyncIterator[Any]:
+        """Advance a blocking iterator in worker threads, one item per fetch"""
+        done = object()
+        while True:
+            item = await self.fetch(host, next, iterator, done)
+            if item is done:
+                return
+            yield item
+
+    async def write(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Hand a function to the database writer and wait for its result"""
+        return await asyncio.wrap_future(self.writer.submit(fn, *args))
+
+    def run(self, jobs: list[Awaitable[Any]]) -> list[Any]:
+        """Run the jobs at the same time until all are done
+
+        Returns per job its result or its exception
+        """
+        # Semaphores belong to the event loop of a run
+        self.semaphores = {}
+        return asyncio.run(self._gather(jobs))
+
+    @staticmethod
+    async def _gather(jobs: list[Awaitable[Any]]) -> list[Any]:
+        return await asyncio.gather(*jobs, return_exceptions=True)
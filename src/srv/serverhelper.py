@@ -1,7 +1,7 @@
 """
 @author: Arno
 @created: 2023-06-03
-@modified: 2023-07-18
+@modified: 2026-10-17
 
 Helper functions for Server
 
@@ -24,7 +24,7 @@ def get_wallets_per_site(
 
     And return a dict with key = Site.id and values = list of wallets
     """
-    walletsraw: list = get_all_active_wallets(db)
+    walletsraw: list[tuple] = get_all_active_wallets(db)
     wallets = {}
     for rawdata in walletsraw:
         siteid = rawdata[1]
@@ -1,24 +1,59 @@
 """
 @author: Arno
 @created: 2023-07-10
-@modified: 2023-10-27
+@modified: 2026-10-17
 
 Helper functions for Server
 
 """
 import logging
+from typing import Iterable
 
 from src.data.dbschemadata import Site, TransactionRaw
 from src.data.dbschematypes import TransactionType, WalletAddressType
 from src.db.db import Db
-from src.db.dbasset import get_asset_id
-from src.db.dbtransaction import check_transaction_exists, insert_transaction_raw
-from src.db.dbwallet import get_one_wallet_id, get_wallet_id_unknowns, insert_wallet_raw
-from src.db.dbwalletchild import get_walletchild_id, insert_walletchild_raw
+from src.db.dbaddresscache import get_address_cache
+from src.db.dbasset import get_asset_id, get_asset_ids_names
+from src.db.dbtransaction import (
+    get_transaction_keys,
+    insert_transaction_raw,
+    insert_transactions_raw_bulk,
+)
+from src.db.dbwallet import (
+    get_one_wallet_id,
+    get_wallet_id_unknowns,
+    get_wallet_ids_addresses,
+    insert_wallet_raw,
+)
+from src.db.dbwalletchild import insert_walletchildren_bulk, upsert_walletchild_raw
 from src.errors.dberrors import DbError
 
 log = logging.getLogger(__name__)
 
+# Transaction types where the to wallet is an address of this user
+TRANSACTIONTYPES_TO_OWNED = (
+    TransactionType.IN_INCOME,
+    TransactionType.IN_MINING,
+    TransactionType.IN_STAKING,
+    TransactionType.IN_DIVIDEND,
+    TransactionType.IN_AIRDROP,
+    TransactionType.IN_GIFT,
+    TransactionType.IN_UNDEFINED,
+    TransactionType.MOVE_DEPOSIT,
+    TransactionType.TRADE_BUY,
+    TransactionType.TRADE_BUY_SETTLEMENT,
+)
+
+# Transaction types where the from wallet is an address of this user
+TRANSACTIONTYPES_FROM_OWNED = (
+    TransactionType.OUT_EXPENSE,
+    TransactionType.OUT_LOSS,
+    TransactionType.OUT_UNDEFINED,
+    TransactionType.MOVE_WITHDRAWAL,
+    TransactionType.TRADE_SELL,
+    TransactionType.TRADE_SELL_SETTLEMENT,
+)
+
 
 def get_walletchild_ids_join(db: Db, address: str, siteid: int, profileid: int):
     """Get walletchild from db, for specific address and site and profile"""
@@ -30,10 +65,42 @@ def get_walletchild_ids_join(db: Db, address: str, siteid: int, profileid: int):
     return result
 
 
+def get_walletchild_ids_join_addresses(
+    db: Db, addresses: Iterable[str], siteid: int, profileid: int
+) -> dict[str, list[tuple[int, int]]]:
+    """Get walletchilds from db for many addresses of a site and profile at once
+
+    Returns for every found address a list of (wallet_id, walletchild_id)
+    """
+    query = """SELECT walletchild.address, parent_id, walletchild.id FROM walletchild 
+            INNER JOIN wallet ON walletchild.parent_id==wallet.id 
+            WHERE wallet.site_id=? AND wallet.profile_id=? AND walletchild.address IN ({in});"""
+    result: dict[str, list[tuple[int, int]]] = {}
+    for address, parentid, id in db.query_in(
+        query, set(addresses), (siteid, profileid)
+    ):
+        result.setdefault(address, []).append((parentid, id))
+    return result
+
+
 def get_wallet_owned(
     db: Db, address: str, site: Site, profileid: int, allow_unknowns: bool
 ) -> tuple[int, int]:
-    """Get wallet id's from address
+    """Get wallet id's from address, using the address cache
+    Returns the (wallet_id, walletchild_id)"""
+    cache = get_address_cache(db)
+    key = (address, site.id, profileid)
+    ids = cache.get(key)
+    if ids == None:
+        ids = _get_wallet_owned(db, address, site, profileid, allow_unknowns)
+        cache.put(key, ids)
+    return ids
+
+
+def _get_wallet_owned(
+    db: Db, address: str, site: Site, profileid: int, allow_unknowns: bool
+) -> tuple[int, int]:
+    """Get wallet id's from address in database
     Returns the (wallet_id, walletchild_id)"""
 
     # TODO: Also search from wallets of other profiles??
@@ -67,6 +134,16 @@ def get_insert_childwallet_unknowns(
     Returns the (wallet_id, walletchild_id)
     address is not owned and is added to/searched from the unknowns wallet"""
 
+    wallet_uknowns_parent_id = get_insert_wallet_unknowns(db, site, profileid)
+    walletchild_id = upsert_walletchild_raw(
+        db=db, parentid=wallet_uknowns_parent_id, address=address, type=0, used=True
+    )
+
+    return (wallet_uknowns_parent_id, walletchild_id)
+
+
+def get_insert_wallet_unknowns(db: Db, site: Site, profileid: int) -> int:
+    """Get the id of the unknowns wallet of a site, the wallet is added if needed"""
     wallet_uknowns_parent_id = get_wallet_id_unknowns(db, site.id, profileid)
     if wallet_uknowns_parent_id == 0:
         unknown_name = f"Unknowns {site.name}"
@@ -82,18 +159,7 @@ def get_insert_childwallet_unknowns(
             db=db,
         )
         wallet_uknowns_parent_id = get_wallet_id_unknowns(db, site.id, profileid)
-    res_wchild = get_walletchild_id(db, address, wallet_uknowns_parent_id)
-    if len(res_wchild) > 1:
-        raise DbError(
-            f"Multiple wallets found with same address: {address} for site {site.name}"
-        )
-    if len(res_wchild) == 0:
-        insert_walletchild_raw(
-            db=db, parentid=wallet_uknowns_parent_id, address=address, type=0, used=True
-        )
-        res_wchild = get_walletchild_id(db, address, wallet_uknowns_parent_id)
-
-    return (wallet_uknowns_parent_id, res_wchild[0][0])
+    return wallet_uknowns_parent_id
 
 
 def process_and_insert_rawtransaction(
@@ -120,18 +186,7 @@ def process_and_insert_rawtransaction(
     towalletid = 0
     towalletchildid = 0
 
-    if (
-        txn.transactiontype == TransactionType.IN_INCOME
-        or txn.transactiontype == TransactionType.IN_MINING
-        or txn.transactiontype == TransactionType.IN_STAKING
-        or txn.transactiontype == TransactionType.IN_DIVIDEND
-        or txn.transactiontype == TransactionType.IN_AIRDROP
-        or txn.transactiontype == TransactionType.IN_GIFT
-        or txn.transactiontype == TransactionType.IN_UNDEFINED
-        or txn.transactiontype == TransactionType.MOVE_DEPOSIT
-        or txn.transactiontype == TransactionType.TRADE_BUY
-        or txn.transactiontype == TransactionType.TRADE_BUY_SETTLEMENT
-    ):
+    if txn.transactiontype in TRANSACTIONTYPES_TO_OWNED:
         # wallet to is this users address
         fromwalletid, fromwalletchildid = get_wallet_owned(
             db, txn.from_wallet, site, profileid, True
@@ -139,14 +194,7 @@ def process_and_insert_rawtransaction(
         towalletid, towalletchildid = get_wallet_owned(
             db, txn.to_wallet, site, profileid, False
         )
-    if (
-        txn.transactiontype == TransactionType.OUT_EXPENSE
-        or txn.transactiontype == TransactionType.OUT_LOSS
-        or txn.transactiontype == TransactionType.OUT_UNDEFINED
-        or txn.transactiontype == TransactionType.MOVE_WITHDRAWAL
-        or txn.transactiontype == TransactionType.TRADE_SELL
-        or txn.transactiontype == TransactionType.TRADE_SELL_SETTLEMENT
-    ):
+    if txn.transactiontype in TRANSACTIONTYPES_FROM_OWNED:
         # wallet from is this users address
         fromwalletid, fromwalletchildid = get_wallet_owned(
             db, txn.from_wallet, site, profileid, False
@@ -155,20 +203,6 @@ def process_and_insert_rawtransaction(
             db, txn.to_wallet, site, profileid, True
         )
 
-    txn_exists = check_transaction_exists(
-        db=db,
-        txid=txn.txid,
-        towalletid=towalletid,
-        towalletchildid=towalletchildid,
-    )
-    if txn_exists:
-        # TODO: what if other profile has same transaction..., raise error?
-        log.exception(f"Transaction already exist with same hash {txn.txid}")
-        return False
-        raise DbError(
-            f"Not allowed to create new transaction with same hash {txn.txid}"
-        )
-
     quoteassetid = get_asset_id(db, txn.quote_asset, chain)
     baseassetid = (
         None if txn.base_asset == "" else get_asset_id(db, txn.base_asset, chain)
@@ -193,4 +227,171 @@ def process_and_insert_rawtransaction(
         fee_cents=txn.fee,
         note=txn.note,
     )
-    return result > 0
+    if result == 0:
+        # TODO: what if other profile has same transaction..., raise error?
+        log.debug(f"Transaction already exist with same hash {txn.txid}")
+        return False
+    return True
+
+
+def get_wallets_owned(
+    db: Db, addresses: dict[str, bool], site: Site, profileid: int
+) -> dict[str, tuple[int, int]]:
+    """Get wallet id's for many addresses at once, same rules as get_wallet_owned
+    addresses = address with allow_unknowns
+    Returns per address the (wallet_id, walletchild_id)"""
+    cache = get_address_cache(db)
+    cached: dict[str, tuple[int, int]] = {}
+    for address in addresses:
+        ids = cache.get((address, site.id, profileid))
+        if ids != None:
+            cached[address] = ids
+    addresses = {
+        address: allow_unknowns
+        for address, allow_unknowns in addresses.items()
+        if address not in cached
+    }
+    result: dict[str, tuple[int, int]] = {}
+
+    # search wallet addresses
+    for address, ids in get_wallet_ids_addresses(
+        db, addresses, site.id, profileid
+    ).items():
+        if len(ids) > 1:
+            raise DbError(
+                f"Multiple wallets found with same address: {address} for site {site.id}"
+            )
+        result[address] = (ids[0], 0)
+
+    # search child addresses
+    remaining = [address for address in addresses if address not in result]
+    children = get_walletchild_ids_join_addresses(db, remaining, site.id, profileid)
+    unknowns: list[str] = []
+    for address in remaining:
+        res_wchild = children.get(address, [])
+        if len(res_wchild) > 1:
+            raise DbError(
+                f"Multiple wallets found with same address: {address} for site {site.name}"
+            )
+        if len(res_wchild) == 1:
+            result[address] = res_wchild[0]
+            continue
+        if not addresses[address]:
+            raise DbError(
+                f"No wallets found with address: {address} for site {site.name}"
+            )
+        unknowns.append(address)
+
+    if len(unknowns) > 0:
+        result.update(get_insert_childwallets_unknowns(db, unknowns, site, profileid))
+    for address, ids in result.items():
+        cache.put((address, site.id, profileid), ids)
+    result.update(cached)
+    return result
+
+
+def get_insert_childwallets_unknowns(
+    db: Db, addresses: list[str], site: Site, profileid: int
+) -> dict[str, tuple[int, int]]:
+    """Add many not owned addresses to the unknowns wallet at once
+    Returns per address the (wallet_id, walletchild_id)"""
+    wallet_uknowns_parent_id = get_insert_wallet_unknowns(db, site, profileid)
+    insert_walletchildren_bulk(
+        db, ((wallet_uknowns_parent_id, address, 0, True) for address in addresses)
+    )
+    children = get_walletchild_ids_join_addresses(db, addresses, site.id, profileid)
+    return {address: ids[0] for address, ids in children.items()}
+
+
+def process_and_insert_rawtransactions(
+    db: Db, txns: list[TransactionRaw], profileid: int, site: Site, chain: str = ""
+) -> list[bool]:
+    """Processing a batch of raw transactions before inserting into db
+
+    Same as process_and_insert_rawtransaction for a list of transactions,
+    every distinct address and asset is looked up once for the whole batch
+    and the new transactions are inserted at once
+
+    Returns per transaction true when it is added to database
+    """
+    log.debug(
+        f"Trying to insert {len(txns)} raw txns for profileid {profileid} and site {site.name} and chain {chain}"
+    )
+    # address with allow_unknowns
+    addresses: dict[str, bool] = {}
+    assets: set[str] = set()
+    for txn in txns:
+        if txn.transactiontype == TransactionType.UNDEF_UNDEFINED:
+            log.exception(f"Transaction has undefined transactiontype {txn.txid}")
+            raise DbError(
+                f"Not allowed to create new transaction with undefined transactiontype {txn.txid}"
+            )
+        if txn.transactiontype in TRANSACTIONTYPES_TO_OWNED:
+            addresses[txn.from_wallet] = addresses.get(txn.from_wallet, True)
+            addresses[txn.to_wallet] = False
+        if txn.transactiontype in TRANSACTIONTYPES_FROM_OWNED:
+            addresses[txn.from_wallet] = False
+            addresses[txn.to_wallet] = addresses.get(txn.to_wallet, True)
+        assets.update(
+            asset
+            for asset in (txn.quote_asset, txn.base_asset, txn.fee_asset)
+            if asset != ""
+        )
+
+    with db.transaction():
+        wallets = get_wallets_owned(db, addresses, site, profileid)
+        assetids: dict[str, int] = {}
+        for name, ids in get_asset_ids_names(db, assets, chain).items():
+            if len(ids) == 0:
+                raise DbError(f"No asset found {name} on chain {chain}")
+            if len(ids) > 1:
+                raise DbError(f"More than 1 asset found {name} on chain {chain}: {ids}")
+            assetids[name] = ids[0]
+
+        existing = get_transaction_keys(db, (txn.txid for txn in txns))
+        results: list[bool] = []
+        rows: list[tuple] = []
+        for txn in txns:
+            fromwalletid, fromwalletchildid = (0, 0)
+            towalletid, towalletchildid = (0, 0)
+            # Same as one txn, only these types are looked up
+            if (
+                txn.transactiontype in TRANSACTIONTYPES_TO_OWNED
+                or txn.transactiontype in TRANSACTIONTYPES_FROM_OWNED
+            ):
+                fromwalletid, fromwalletchildid = wallets[txn.from_wallet]
+                towalletid, towalletchildid = wallets[txn.to_wallet]
+            key = (
+                txn.txid,
+                fromwalletid,
+                fromwalletchildid,
+                towalletid,
+                towalletchildid,
+            )
+            if key in existing:
+                log.debug(f"Transaction already exist with same hash {txn.txid}")
+                results.append(False)
+                continue
+            existing.add(key)
+            results.append(True)
+            rows.append(
+                (
+                    profileid,
+                    site.id,
+                    txn.transactiontype.value,
+                    txn.timestamp,
+                    txn.txid,
+                    fromwalletid,
+                    None if fromwalletchildid == 0 else fromwalletchildid,
+                    towalletid,
+                    None if towalletchildid == 0 else towalletchildid,
+                    assetids[txn.quote_asset],
+                    None if txn.base_asset == "" else assetids[txn.base_asset],
+                    None if txn.fee_asset == "" else assetids[txn.fee_asset],
+                    txn.quantity,
+                    txn.fee,
+                    txn.note,
+                )
+            )
+        insert_transactions_raw_bulk(db, rows)
+    return results
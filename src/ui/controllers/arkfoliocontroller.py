@@ -1,20 +1,20 @@
 """
 @author: Arno
 @created: 2023-05-18
-@modified: 2023-10-26
+@modified: 2026-10-17
 
 Controller for ArkFolio
 
 """
 import logging
 from dataclasses import asdict
-from typing import Protocol
+from typing import Iterator, Protocol
 
 import pandas as pd
 from pandas import DataFrame
 
 import configprivate as conf
-from src.data.dbschemadata import Profile, Transaction, Wallet
+from src.data.dbschemadata import Profile, Wallet
 from src.data.dbschematypes import SiteType, WalletAddressType
 from src.db.db import Db
 from src.db.dbinit import db_connect
@@ -73,41 +73,41 @@ class ArkfolioController:
     def get_txns(self) -> DataFrame:
         """Get transactions from database
         And convert to pandas dataframe"""
-        txns: list[Transaction] = get_transactions(self.db, self.profile)
         txnsview: list = []
-        for txn in txns:
-            from_walletchildaddress = ""
-            from_walletchildtype = ""
-            to_walletchildaddress = ""
-            to_walletchildtype = ""
-            if txn.from_wallet.haschild and txn.from_walletchild != None:
-                from_walletchildaddress = txn.from_walletchild.address
-                from_walletchildtype = txn.from_walletchild.type.name
-            if txn.to_wallet.haschild and txn.to_walletchild != None:
-                to_walletchildaddress = txn.to_walletchild.address
-                to_walletchildtype = txn.to_walletchild.type.name
-            t = {
-                "datetime": convert_timestamp(txn.timestamp),
-                "txn_type": txn.transactiontype.name,
-                "site": txn.site.name,
-                "quantity": txn.quantity.amount,
-                "quantity.currency": txn.quantity.currency_symbol,
-                "fee": txn.fee.amount,
-                "fee.currency": txn.fee.currency_symbol,
-                "from_type": txn.from_wallet.addresstype.name,
-                "from_wallet.name": txn.from_wallet.name,
-                "from_wallet.address": txn.from_wallet.address,
-                "from_child.address": from_walletchildaddress,
-                "from_child.type": from_walletchildtype,
-                "to_type": txn.to_wallet.addresstype.name,
-                "to_wallet.name": txn.to_wallet.name,
-                "to_wallet.address": txn.to_wallet.address,
-                "to_child.address": to_walletchildaddress,
-                "to_child.type": to_walletchildtype,
-                "note": txn.note,
-                "id": txn.id,
-            }
-            txnsview.append(t)
+        with get_transactions(self.db, self.profile) as txns:
+            for txn in txns:
+                from_walletchildaddress = ""
+                from_walletchildtype = ""
+                to_walletchildaddress = ""
+                to_walletchildtype = ""
+                if txn.from_wallet.haschild and txn.from_walletchild != None:
+                    from_walletchildaddress = txn.from_walletchild.address
+                    from_walletchildtype = txn.from_walletchild.type.name
+                if txn.to_wallet.haschild and txn.to_walletchild != None:
+                    to_walletchildaddress = txn.to_walletchild.address
+                    to_walletchildtype = txn.to_walletchild.type.name
+                t = {
+                    "datetime": convert_timestamp(txn.timestamp),
+                    "txn_type": txn.transactiontype.name,
+                    "site": txn.site.name,
+                    "quantity": txn.quantity.amount,
+                    "quantity.currency": txn.quantity.currency_symbol,
+                    "fee": txn.fee.amount,
+                    "fee.currency": txn.fee.currency_symbol,
+                    "from_type": txn.from_wallet.addresstype.name,
+                    "from_wallet.name": txn.from_wallet.name,
+                    "from_wallet.address": txn.from_wallet.address,
+                    "from_child.address": from_walletchildaddress,
+                    "from_child.type": from_walletchildtype,
+                    "to_type": txn.to_wallet.addresstype.name,
+                    "to_wallet.name": txn.to_wallet.name,
+                    "to_wallet.address": txn.to_wallet.address,
+                    "to_child.address": to_walletchildaddress,
+                    "to_child.type": to_walletchildtype,
+                    "note": txn.note,
+                    "id": txn.id,
+                }
+                txnsview.append(t)
 
         df = pd.DataFrame(txnsview)
         return df
@@ -147,7 +147,7 @@ class ArkfolioController:
     def get_wallets(self) -> DataFrame:
         """Get wallets from database
         And convert to pandas dataframe"""
-        wallets: list[Wallet] = get_wallets(self.db, self.profile)
+        wallets: Iterator[Wallet] = get_wallets(self.db, self.profile)
         walletsview: list = []
         for wallet in wallets:
             site_name = "-"
@@ -0,0 +1,19 @@
+"""
+@author: Arno
+@created: 2026-10-17
+@modified: 2026-10-17
+
+Query plans of the sql of the data layer, fails on a scan of a large table
+
+usage:
+    python -m pytest tests
+
+"""
+from src.db.dbqueryplan import check_query_plans, report
+
+
+def test_no_scan_of_large_tables():
+    plans = check_query_plans()
+    assert len(plans) > 0
+    failed = [plan for plan in plans if not plan.ok]
+    assert failed == [], report(failed)